@@ -1,669 +1,3202 @@
-# -*- coding: utf-8 -*-
-"""
-File: SmartAnalyze.py
-Created on Sun Jun 28 20:24:24 2020
-Author: Difang Huang, Hanlin Dong
-
-README:
-   Introduction
-   ----------------------------------------------------------------------------
-   The SmartAnalyze provides OpenSees users a easier way to conduct analyses.
-   There are two main functions defined in this .py file. SmartAnalyzeTransient & SmartAnalyzeStatic.
-   
-   SmartAnalyzeTransient is used to conduct time history analyses.
-        The arguments must be specified are:
-            dt: delta t
-            npts: number of points.
-   
-    SmartAnalyzeStatic is used to conduct static analyze.
-        Users provide a loading protocol with displacement targets.
-        Then SmartAnalyze will run DisplacementControl analyses accordingly.
-        The arguments that must be specified are:
-            node: the node tag in the displacement control
-            dof: the dof in the displacement control
-            maxStep: the maximum step length in the displacement control
-            targets: a list of target displacements.
-                (E.g. {1 -1 1 -1 0} will result in cyclic load of disp amplitude 1 twice.)
-                Note: the first element must be positive.
-    
-    If the control array is not specified, all the default values will be used.
-    If you want to change the control parameters, pass it as an array delegate.
-    
-    Example
-    ---------------------------------------------------------------------------
-    Example 1: Basic usage for Transient
-        import SmartAnalyze
-        constraints('Transformation')
-        numberer('Plain')
-        system('BandGeneral')
-        integrator('Newmark', 0.5, 0.25)
-        SmartAnalyzeTransient(dt, npts)
-    
-    Example 2: Basic usage for Static 
-        import SmartAnalyze
-        constraints('Transformation')
-        numberer('Plain')
-        system('BandGeneral')
-        protocol=[1, -1, 1, -1, 0]
-        SmartAnalyzeStatic(node, dof, maxStep, protocol)
-    
-    Example 3: change control parameters
-        control['printPer']=20
-        control['tryAlterAlgoTypes']=True
-        control['algoTypes']=[20, 30]
-        SmartAnalyzeTransient(dt, npts, control)
-        
-    Example 4: define user algorithm
-        def UserAlgorithm0():
-            algorithm('KrylovNewton', increment='initial', maxDim=10)
-        control['algoTypes']=[80]
-        SmartAnalyzeTransient(dt, npts, control)
-    
-    The work flow
-    ---------------------------------------------------------------------------
-        1. Start
-        2. Set initial step length, algorithm method and test (You don't need to specify them in your model.)
-        3. Divide the whole analysis into pieces. For Static, use maxStep. For Transient, use dt.
-        4. Loop by each piece and analyze recursively with RecursiveAnalyze, in the following way
-            4.1 Trail analyze for one step, if converge, continue loop 4.
-            4.2 If not converge, if tryAddTestTimes is True, if the last test norm is smaller than normTol, recursively set a larger test time.
-            4.3 If not converge, if tryAlterAlgoTypes is True, recursively loop to the next algo type.
-            4.4 If not converge, divide the current step into two steps. The first one equals to the current step times relaxation.
-            4.5 If either step is smaller than minStep:
-                4.5.1 If tryLooseTestTol is True, loose test tolerance to looseTestTolTo.
-                4.5.2 Else, return not converge code. Exit.
-            4.6 If both steps are not smaller than minStep, divide the current piece into two and re-run loop 4.
-        5. If converge, return success message.
-    
-    Control Parameters
-    ---------------------------------------------------------------------------
-    TEST RELATED:
-        `testType`        : string. Identical to the testType in OpenSees test command. Default is "EnergyIncr".
-                            Choices see http://opensees.berkeley.edu/wiki/index.php/Test_Command.
-        `testTol`         : float. The initial test tolerance set to the OpenSees test command. Default is 1.0e-6.
-                            If tryLooseTestTol is set to True, the test tolerance can be loosen.
-        `testIterTimes`   : integer. The initial number of test iteration times. Default is 7.
-                            If tryAddTestTimes is set to True, the number of test times can be enlarged.
-        `testPrintFlag`   : integer. The test print flag in OpenSees Test command. Default is 0.
-                            Choices see http://opensees.berkeley.edu/wiki/index.php/Test_Command.
-        `tryAddTestTimes` : boolean. Default is True If this is set to True, 
-                            the number of test times will be enlarged if the last test norm is smaller than `normTol`,
-                            the enlarged number is specified in `testIterTimesMore`.
-                            Otherwise, the number of test times will always be equal to `testIterTimes`.
-        `normTol`         : float. Only useful when tryAddTestTimes is True. Default is 1.0e3.
-                            If unconverge, the last norm of test will be compared to `normTol`.
-                            If the norm is smaller, the number of test times will be enlarged.
-        `testIterTimesMore` : integer. Only useful when tryaddTestTimes is True. Default is 50.
-                            If unconverge and norm is ok, the test iteration times will be set to this number.
-        `tryLooseTestTol` : boolean. If this is set to True, if unconverge at minimum step,
-                            the test tolerance will be loosen to the number specified by `looseTestTolTo`.
-                            the step will be set back.
-                            Default is True.
-        `looseTestTolTo`  : float. Only useful if tryLooseTestTol is True.
-                            If unconvergance at the min step, the test tolerance will be set to this value.
-                            Default is 1.0
-    
-    ALGORITHM RELATED:
-        `tryAlterAlgoTypes` : boolean. Default is False.
-                              If True, different algorithm types specified in `algoTypes` will be tried during unconvergance.
-                              If False, the first algorithm type specified in `algoTypes` will be used.
-        `algoTypes`         : list of integer. A list of flags of the algorithms to be used during unconvergance.
-                              The integer flag is documented in the following section.
-                              Only useful when tryAlterAlgoTypes is True.
-                              The first flag will be used by default.
-                              The algorithm command in the model will be ignored.
-                              Default is { 40 }
-                              If you need other algorithm, try a user-defined algorithm. See the following section.
-        
-    STEP RELATED:
-        `initialStep`     : float. Default is equal to $dt.
-                            Specifying the initial Step length to conduct analysis.
-        `relaxation`      : float, between 0 and 1. Default is 0.5.
-                            A factor that is multiplied by each time the step length is shortened.
-        `minStep`         : float. Default is 1.0e-6.
-                            The step tolerance when shortening the step length.
-                            If step length is smaller than minStep, special ways to converge the model will be used according to `try-` flags.
-    
-    LOGGING RELATED:
-        `printPer`        : integer. Print to the console every several trials. Default is 10. 
-                            If `tqdm` is installed (packed in anaconda) defaults to 0 (use progress bar instead).
-        `debugMode`       : boolean. Print as much information as possible.
-    
-    Algorithm type flag reference
-    ---------------------------------------------------------------------------
-     0:  Linear
-     1:  Linear -initial
-     2:  Linear -factorOnce
-    10:  Newton
-    11:  Newton -initial
-    12:  Newton -initialThenCurrent
-    20:  NewtonLineSearch
-    21:  NewtonLineSearch -type Bisection
-    22:  NewtonLineSearch -type Secant
-    23:  NewtonLineSearch -type RegulaFalsi
-    30:  ModifiedNewton
-    31:  ModifiedNewton -initial
-    40:  KrylovNewton
-    41:  KrylovNewton -iterate initial
-    42:  KrylovNewton -increment initial
-    43:  KrylovNewton -iterate initial -increment initial
-    44:  KrylovNewton -maxDim 6
-    50:  SecantNewton
-    51:  SecantNewton -iterate initial
-    52:  SecantNewton -increment initial 
-    53:  SecantNewton -iterate initial -increment initial
-    60:  BFGS
-    70:  Broyden    
-    80:  PeriodicNewton
-    90:  User-defined0
-    
-    About User-defined algoType:
-        If special algorithm is to be used, SmartAyalize provides 3 user-defined algorithms.
-        The script author should specify the algorithm as a procedure in the script.
-        The script name must be `UserAlgorithm0`, `UserAlgorithm1`, `UserAlgorithm2`.
-        Example see section Example No. 4.
-        
-    Change Log
-    ---------------------------------------------------------------------------
-    Mon Jun 29 16:10:18 2020 v0.0
-        Creat SmartAnalyze.py file.
-    Wed Feb 17 19:44:00 2021 v0.1
-        Change getCTestNorms() to testNorms()
-    Sun Feb 18 15:00:00 2023 v4.0.3
-        Improve output. Add a progress bar. 
-        Make version compatible to the tcl code.
-"""
-
-version = "4.0.3"
-
-import openseespy.opensees as ops 
-import time
-
-has_tqdm = True
-try:
-    from tqdm import tqdm
-except ImportError:
-    print("""Warning: python module `tqdm` is not installed.""")
-    has_tqdm = False
-
-    def tqdm(x, **kwargs):
-        return x
-
-def SmartAnalyzeTransient(dt, npts, ud=None):
-    '''
-    dt: delta t
-    npts: number of points
-    ud: change the control parameters in control dict
-    '''
-    # default control parameters
-    control={}
-    control['analysis']="Transient"
-    control['testType']="EnergyIncr"
-    control['testTol']=1.0e-6
-    control['testIterTimes']=7
-    control['testPrintFlag']=0
-    control['tryAddTestTimes']=False
-    control['normTol']=1.0e3
-    control['testIterTimesMore']=50
-    control['tryLooseTestTol']=False
-    control['looseTestTolTo']=1.0
-    control['tryAlterAlgoTypes']=False
-    control['algoTypes']=[40]                              
-    control['initialStep']=dt
-    control['relaxation']=0.5
-    control['minStep']=1.0e-6
-    control['printPer']=10 if not has_tqdm else 0
-    control['debugMode']=False
-    
-    # set user control parameters
-    if ud is not None:
-        userControl=ud                                      
-        control.update(userControl)
-    printBanner()
-    print("Control parameters:")
-    for key,value in control.items():
-        print(key, value)
-    
-    # initialize analyze commands
-    ops.test(control['testType'],control['testTol'],control['testIterTimes'],control['testPrintFlag'])
-    setAlgorithm(control['algoTypes'][0])
-    ops.analysis('Transient')
-    
-    # set an array to store current status.
-    current={}
-    current['startTime']=time.time()
-    current['algoIndex']=0
-    current['testIterTimes']=control['testIterTimes']
-    current['testTol']=control['testTol']
-    current['counter']=0
-    current['progress']=0
-    current['segs']=npts
-    
-    # divide the whole process into segments.
-    for seg in tqdm(range(1,npts+1), desc="SmartAnalysisProgress", position=0):
-        ok=RecursiveAnalyze(control['initialStep'],0,control['testIterTimes'],control['testTol'],control,current)
-        # if not converge, break the loop and print information.
-        if ok<0:
-            print(">>> SmartAnalyze: Analyze failed. Time consumption: %f s." %(time.time()-current['startTime']))
-            return ok
-        
-        # converged, update progress
-        current['progress']=seg
-        
-        # show progress
-        if control['debugMode']:
-            print("*** SmartAnalyze: progress %f" %(current['progress']/current['segs']))
-    
-    # the analysis is done.
-    print(">>> SmartAnalyze: Successfully finished! Time consumption: %f s." %(time.time()-current['startTime']))
-
-
-def SmartAnalyzeStatic(node, dof, maxStep, targets, ud=''):
-    '''
-    node: the node tag in the displacement control
-    dof: the dof in the displacement control
-    maxStep: the maximum step length in the displacement control
-    targets: a list of target displacements, the first element must be positive
-    ud: change the control parameters in control dict
-    '''
-    # set initial step
-    if maxStep>targets[0]:
-        initialStep=targets[0]
-    else:
-        initialStep=maxStep
-    
-    # default control parameters
-    control={}
-    control['analysis']="Static"
-    control['testType']="EnergyIncr"
-    control['testTol']=1.0e-6
-    control['testIterTimes']=7
-    control['testPrintFlag']=0
-    control['tryAddTestTimes']=False
-    control['normTol']=1.0e3
-    control['testIterTimesMore']=50
-    control['tryLooseTestTol']=False
-    control['looseTestTolTo']=1.0
-    control['tryAlterAlgoTypes']=False
-    control['algoTypes']=[40]
-    control['initialStep']=initialStep
-    control['relaxation']=0.5
-    control['minStep']=1.0e-6
-    control['printPer']=10 if not has_tqdm else 0
-    control['debugMode']=False
-    
-    # set user control parameters
-    if ud!='':
-        userControl=ud
-        control.update(userControl)
-    printBanner()
-    print("Control parameters:")
-    for key,value in control.items():
-        print(key, value)
-    
-    # initialize analyze commands
-    ops.test(control['testType'],control['testTol'],control['testIterTimes'],control['testPrintFlag'])
-    setAlgorithm(control['algoTypes'][0])
-    ops.integrator('DisplacementControl', node, dof, initialStep)
-    ops.analysis('Static')
-    
-    # set an array to store current status.
-    current={}
-    current['startTime']=time.time()
-    current['algoIndex']=0
-    current['testIterTimes']=control['testIterTimes']
-    current['testTol']=control['testTol']
-    current['counter']=0
-    current['progress']=0
-    current['step']=initialStep
-    current['node']=node
-    current['dof']=dof
-    
-    # calcuate whole distance; divide the whole process into segments.
-    distance=0
-    segs=[]                                          # Divide the protocol to small segments
-    for i in range(len(targets)):                    
-        if i==0:                                     # The first disp segment is always in the positive direction.
-            section=targets[0]                       
-            positive=True                            
-        else:                                        
-            section=targets[i]-targets[i-1]          
-            if section>=0:                           
-                positive=True           
-            else:                                    
-                positive=False
-        
-        distance=distance+abs(section)               # distance, used to calculate progress.
-        
-        if positive:                                 
-            j=0
-            while (section-j*maxStep)>maxStep:       # divide the current protocol to segments
-                segs.append(maxStep)
-                j+=1
-            segs.append(section-j*maxStep)           # The last segment.
-            
-        else:                                        
-            j=0
-            while (-section-j*maxStep)>maxStep:      
-                segs.append(-maxStep)
-                j+=1
-            segs.append(section+j*maxStep)           
-    
-    current['segs']=len(segs)                        
-    
-    # Run recursive analysis
-    for seg in tqdm(segs, desc="SmartAnalysisProgress", position=0):
-        ok=RecursiveAnalyze(seg, 0, control['testIterTimes'], control['testTol'], control, current)
-        if ok<0:               
-            print(">>> SmartAnalyze: Analyze failed. Time consumption: %f s." %(time.time()-current['startTime']))
-            return ok
-        # converge
-        current['progress']+=1
-        
-        if control['debugMode']:
-            print("*** SmartAnalyze: progress %f" %(current['progress']/current['segs']))
-
-    print(">>> SmartAnalyze: Successfully Finished! Time consumption: %f s." %(time.time()-current['startTime']))
-    
-    
-    
-    
-    
-
-def RecursiveAnalyze(step, algoIndex, testIterTimes, testTol, vcontrol, vcurrent):
-    '''
-    step: dt for transient analysis, and a displacement step length for static analysis.
-    algoIndex: Algorithm index that is used.
-    testIterTimes: Maximum nunmber of tests.
-    testTol: test tolarence.
-    vcontrol: control variables
-    vcurrent: current control variables
-    '''
-    control=vcontrol
-    current=vcurrent
-    
-    if control['debugMode']:
-        print('CONTROL PARAMETERS:')
-        print(control)
-        print('CURRENT STATE PARAMETERS:')
-        print(current)
-        print('\n')
-    
-    # print the control parameters
-    if control['debugMode']:
-        print("*** SmartAnalyze: Run Recursive: step=%f, algoI=%i, times=%i, tol=%f" %(step, algoIndex, testIterTimes, testTol))
-        print('\n')
-    
-    # switch algorithm
-    if algoIndex!=current['algoIndex']:
-        print(">>> SmartAnalyze: Setting algorithm to %i" %(control['algoTypes'][algoIndex]))
-        print('\n')
-        setAlgorithm(control['algoTypes'][algoIndex])
-        current['algoIndex']=algoIndex
-    
-    # change number of tests and tolerance
-    if testIterTimes!=current['testIterTimes'] or testTol!=current['testTol']:
-        if testIterTimes!=current['testIterTimes']:
-            print(">>> SmartAnalyze: Setting test iteration times to %i" %(testIterTimes))
-            print('\n')
-            current['testIterTimes']=testIterTimes
-        if testTol!=current['testTol']:
-            print("SmartAnalyze: Setting test tolerance to %f" %(testTol))
-            print('\n')
-            current['testTol']=testTol
-            
-        ops.test(control['testType'], testTol, testIterTimes, control['testPrintFlag'])
-    
-    # change step length
-    if control['analysis']=='Static' and current['step']!=step:
-        # print(">>> SmartAnalyze: Setting step to %f" %(step))
-        # print('\n')
-        ops.integrator('DisplacementControl', current['node'], current['dof'], step)
-        current['step']=step
-    
-    # trial analyze once
-    if control['analysis']=='Static':
-        ok=ops.analyze(1)
-    else:
-        ok=ops.analyze(1, step)
-    
-    current['counter']+=1
-    
-    if ok==0:
-        if control['printPer'] != 0 and current['counter']>=control['printPer']:
-            print("* SmartAnalyze: progress %f. Time consumption: %f s." 
-                %(current['progress']/current['segs'], (time.time()-current['startTime'])/1000.0))
-            print('\n')
-            current['counter']=0
-        return 0
-    
-    # not converge, start to search for a solution.
-    # Add test iteration times. Use current step, algorithm and test tolerance.
-    if control['tryAddTestTimes'] and testIterTimes!=control['testIterTimesMore']:
-        norm=ops.testNorms()
-        # if current norm is close to converge, add the number of tests.
-        if norm[-1]<control['normTol']:
-            print(">>> SmartAnalyze: Adding test times to %i." %(control['testIterTimesMore']))
-            print('\n')
-            return RecursiveAnalyze(step, algoIndex, control['testIterTimesMore'], testTol, control, current)
-        # if current norm is too large, try another way.
-        else:
-            print(">>> SmartAnalyze: Not adding test times for norm %f" %(norm[-1]))
-            print('\n')
-    
-    # Change algorithm. Set back test iteration times.
-    if control['tryAlterAlgoTypes'] and (algoIndex+1)<len(control['algoTypes']):
-        algoIndex+=1
-        print(">>> SmartAnalyze: Setting algorithm to  %i." %(control['algoTypes'][algoIndex]))
-        print('\n')
-        return RecursiveAnalyze(step, algoIndex, testIterTimes, testTol, control, current)
-    
-    # If step length is too small, try add test tolerance. set algorithm and test iteration times back.
-    if abs(step)<2*control['minStep']:
-        print(">>> SmartAnalyze: current step %f is too small!" %(step))
-        print('\n')
-        if control['tryLooseTestTol'] and current['testTol']!=control['looseTestTolTo']:
-            print("!!! SmartAnalyze: Warning: Loosing test tolerance")
-            print('\n')
-            return RecursiveAnalyze(step, 0, control['testIterTimes'], control['looseTestTolTo'], control, current)
-        
-        # Here, all methods have been tried. Return negative value.
-        return -1
-    
-    # Split the current step into two steps.
-    stepNew=step*control['relaxation']
-    if stepNew>0 and stepNew<control['minStep']:
-        stepNew=control['minStep']
-    
-    if stepNew<0 and stepNew>-control['minStep']:
-        stepNew=-control['minStep']
-    
-    stepRest=step-stepNew
-    print(">>> SmartAnalyze: Dividing the current step %f into %f and %f" %(step, stepNew, stepRest))
-    print('\n')
-    ok=RecursiveAnalyze(stepNew, 0, testIterTimes, testTol, control, current)
-    if ok<0:
-        return -1
-    ok=RecursiveAnalyze(stepRest, 0, testIterTimes, testTol, control, current)
-    if ok<0:
-        return -1
-    return 1
-        
-        
-    
-
-def setAlgorithm(algotype):
-    '''
-        Predefine some algorithms.
-    '''
-    def case0():
-        print("> SmartAnalyze: Setting algorithm to  Linear ...")
-        ops.algorithm('Linear')
-    
-    def case1():
-        print("> SmartAnalyze: Setting algorithm to  Linear -initial ...")
-        ops.algorithm('Linear', initial=True)
-    
-    def case2():
-        print("> SmartAnalyze: Setting algorithm to  Linear -factorOnce ...")
-        ops.algorithm('Linear', factorOnce=True)
-        
-    def case10():
-        print("> SmartAnalyze: Setting algorithm to  Newton ...")
-        ops.algorithm('Newton')
-    
-    def case11():
-        print("> SmartAnalyze: Setting algorithm to  Newton -initial ...")
-        ops.algorithm('Newton', initial=True)
-    
-    def case12():
-        print("> SmartAnalyze: Setting algorithm to  Newton -initialThenCurrent ...")
-        ops.algorithm('Newton', initialThenCurrent=True)
-    
-    def case20():
-        print("> SmartAnalyze: Setting algorithm to  NewtonLineSearch ...")
-        ops.algorithm('NewtonLineSearch')
-    
-    def case21():
-        print("> SmartAnalyze: Setting algorithm to  NewtonLineSearch -type Bisection ...")
-        ops.algorithm('NewtonLineSearch', True)
-    
-    def case22():
-        print("> SmartAnalyze: Setting algorithm to  NewtonLineSearch -type Secant ...")
-        ops.algorithm('NewtonLineSearch', Secant=True)
-    
-    def case23():
-        print("> SmartAnalyze: Setting algorithm to  NewtonLineSearch -type RegulaFalsi ...")
-        ops.algorithm('NewtonLineSearch', RegulaFalsi=True)
-    
-    def case30():
-        print("> SmartAnalyze: Setting algorithm to  Modified Newton ...")
-        ops.algorithm('ModifiedNewton')
-    
-    def case31():
-        print("> SmartAnalyze: Setting algorithm to  ModifiedNewton -initial ...")
-        ops.algorithm('ModifiedNewton', False, True)
-    
-    def case40():
-        print("> SmartAnalyze: Setting algorithm to  KrylovNewton ...")
-        ops.algorithm('KrylovNewton')
-    
-    def case41():
-        print("> SmartAnalyze: Setting algorithm to  KrylovNewton -iterate initial ...")
-        ops.algorithm('KrylovNewton', iterate='initial')
-    
-    def case42():
-        print("> SmartAnalyze: Setting algorithm to  KrylovNewton -increment initial ...")
-        ops.algorithm('KrylovNewton', increment='initial')
-    
-    def case43():
-        print("> SmartAnalyze: Setting algorithm to  KrylovNewton -iterate initial -increment initial ...")
-        ops.algorithm('KrylovNewton', iterate='initial', increment='initial')
-    
-    def case44():
-        print("> SmartAnalyze: Setting algorithm to  KrylovNewton -maxDim 50")
-        ops.algorithm('KrylovNewton', maxDim=50)
-    
-    def case45():
-        print("> SmartAnalyze: Setting algorithm to  KrylovNewton -iterate initial -increment initial -maxDim 50")
-        ops.algorithm('KrylovNewton', iterate='initial', increment='initial', maxDim=50)
-    
-    def case50():
-        print("> SmartAnalyze: Setting algorithm to  SecantNewton ...")
-        ops.algorithm('SecantNewton')
-
-    def case51():
-        print("> SmartAnalyze: Setting algorithm to  SecantNewton -iterate initial ...")
-        ops.algorithm('SecantNewton', iterate='initial')
-    
-    def case52():
-        print("> SmartAnalyze: Setting algorithm to  SecantNewton -increment initial  ...")
-        ops.algorithm('SecantNewton', increment='initial')
-    
-    def case53():
-        print("> SmartAnalyze: Setting algorithm to  SecantNewton -iterate initial -increment initial ...")
-        ops.algorithm('SecantNewton', iterate='initial', increment='initial')
-    
-    def case60():
-        print("> SmartAnalyze: Setting algorithm to  BFGS ...")
-        ops.algorithm('BFGS')
-    
-    def case70():
-        print("> SmartAnalyze: Setting algorithm to  Broyden ...")
-        ops.algorithm('Broyden')
-    
-    def case80():
-        print("> SmartAnalyze: Setting algorithm to  PeriodicNewton ...")
-        ops.algorithm('PeriodicNewton')
-    
-    def case90():
-        #UserAlgorithm0
-        pass
-        
-    def default():
-        print("!!! SmartAnalyze: ERROR! WRONG Algorithm Type!")
-    
-    
-    switch={'0':case0, '1':case1, '2':case2, '10':case10,'11':case11, '12':case12,
-            '20':case20, '21':case21, '22':case22, '23':case23,
-            '30':case30, '31':case31, '40':case40, '41':case41, '42':case42, '43':case43, '44':case44, '45':case45,
-            '50':case50, '51':case51,'52':case52,'53':case53, '60':case60, '70':case70, '80':case80, '90':case90, 'default':default}
-    
-    choice=str(algotype)
-    switch.get(choice, default)()
-    
-
-def printBanner():
-    print(""" ********************************************************************** "
- *                           WELCOME TO                               * "
- *  _____                      _    ___              _                * "
- * /  ___|                    | |  / _ \\            | |               * "
- * \\ `--. _ __ ___   __ _ _ __| |_/ /_\\ \\_ __   __ _| |_   _ _______  * "
- *  `--. \\ '_ ` _ \\ / _` | '__| __|  _  | '_ \\ / _` | | | | |_  / _ \\ * "
- * /\\__/ / | | | | | (_| | |  | |_| | | | | | | (_| | | |_| |/ /  __/ * "
- * \\____/|_| |_| |_|\\__,_|_|   \\__\\_| |_/_| |_|\\__,_|_|\\__, /___\\___| * "
- *                                                      __/ |         * "
- *                                                     |___/          * "
- * Author: Hanlin DONG (http://www.hanlindong.com)                    * "
- * License: MIT (https://opensource.org/licenses/MIT).                * "
- ********************************************************************** "
-Smart Analyze version %s loaded. Enjoy!"
-For transient analyze, call SmartAnalyzeTransient dt npts"
-For static analyze, call SmartAnalyzeStatic node dof targets maxStep"
-""" % version)
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# -*- coding: utf-8 -*-
+"""
+File: SmartAnalyze.py
+Created on Sun Jun 28 20:24:24 2020
+Author: Difang Huang, Hanlin Dong
+
+README:
+   Introduction
+   ----------------------------------------------------------------------------
+   The SmartAnalyze provides OpenSees users a easier way to conduct analyses.
+   There are two main functions defined in this .py file. SmartAnalyzeTransient & SmartAnalyzeStatic.
+   
+   SmartAnalyzeTransient is used to conduct time history analyses.
+        The arguments must be specified are:
+            dt: delta t
+            npts: number of points.
+   
+    SmartAnalyzeStatic is used to conduct static analyze.
+        Users provide a loading protocol with displacement targets.
+        Then SmartAnalyze will run DisplacementControl analyses accordingly.
+        The arguments that must be specified are:
+            node: the node tag in the displacement control
+            dof: the dof in the displacement control
+            maxStep: the maximum step length in the displacement control
+            targets: a list of target displacements.
+                (E.g. {1 -1 1 -1 0} will result in cyclic load of disp amplitude 1 twice.)
+        The targets are compiled to the step lengths by compileProtocol, which can be called to inspect them.
+        Any other iterable of targets, e.g. a generator of a long fatigue protocol, is read lazily by streamProtocol.
+        Pass totalDistance to show the progress of it.
+        Standard cyclic protocols are made by cyclicProtocol, fema461Protocol, atc24Protocol and sacProtocol.
+    
+    SmartAnalyzeLoadControl runs SmartAnalyzeStatic with the LoadControl integrator, e.g. for gravity.
+        The arguments that must be specified are:
+            maxStep: the maximum load factor increment.
+        targets are the load factors. Default is [1.0].
+    
+    SmartAnalyzeArcLength runs a number of steps with the ArcLength or MinUnbalDispNorm integrator.
+        The arguments that must be specified are:
+            arcLength: the arc length (the first load factor increment for MinUnbalDispNorm).
+            numSteps: the number of steps.
+        The arc length is constant, so a step that does not converge is not divided.
+    
+    SmartAnalyzePipeline runs stages one after another, e.g. gravity, loadConst, then a pushover or a ground motion.
+        The arguments that must be specified are:
+            stages: a list of dicts. See SmartAnalyzePipeline for the types of stages.
+    
+    SmartAnalyzeBatch runs SmartAnalyzeTransient for many records and scale factors in a process pool.
+        The arguments that must be specified are:
+            buildModel: a function buildModel(record, scale) that builds the model and returns (dt, npts).
+            jobs: a list of (record, scale).
+        If a worker crashes, only the jobs that were running are run again, each in its own process.
+        The checkpoints and the journals of each job are kept apart, see jobControl.
+    
+    SmartAnalyzeForked builds the model once, then runs each job in a process forked from the built model.
+        The arguments that must be specified are:
+            prepare: a function that builds the model and runs the gravity analysis.
+            jobs: a list of jobs.
+            runJob: a function runJob(job) that runs a job on the prepared model.
+    
+    SmartAnalyzeIDA runs an incremental dynamic analysis by hunt and fill, with SmartAnalyzeBatch's buildModel.
+        The scale of each record grows geometrically until the analysis is not successful,
+        then the capacity is bisected between the last stable and the first unstable scale,
+        and the rest of the runs fill the largest gaps below it. The records run in a process pool.
+        The arguments that must be specified are:
+            buildModel: a function buildModel(record, scale) that builds the model and returns (dt, npts).
+            records: a list of records.
+    
+    If the control array is not specified, all the default values will be used.
+    If you want to change the control parameters, pass it as an array delegate.
+    
+    SmartAnalyzeTransient and SmartAnalyzeStatic return a SmartAnalyzeResult, with the status, progress,
+    wall time, number of analyze calls and the failure point. It compares like the old ok code (e.g. `result<0`).
+    Its `perf` attribute holds the time spent in ops.analyze and in reconfiguration, the number of converged
+    and failed calls of each algorithm, the total Newton iterations and a histogram of step lengths.
+    
+    Example
+    ---------------------------------------------------------------------------
+    Example 1: Basic usage for Transient
+        import SmartAnalyze
+        constraints('Transformation')
+        numberer('Plain')
+        system('BandGeneral')
+        integrator('Newmark', 0.5, 0.25)
+        SmartAnalyzeTransient(dt, npts)
+    
+    Example 2: Basic usage for Static 
+        import SmartAnalyze
+        constraints('Transformation')
+        numberer('Plain')
+        system('BandGeneral')
+        protocol=[1, -1, 1, -1, 0]
+        SmartAnalyzeStatic(node, dof, maxStep, protocol)
+    
+    Example 3: change control parameters
+        control['printPer']=20
+        control['tryAlterAlgoTypes']=True
+        control['algoTypes']=[20, 30]
+        SmartAnalyzeTransient(dt, npts, control)
+        
+    Example 4: define user algorithm
+        def UserAlgorithm0():
+            algorithm('KrylovNewton', increment='initial', maxDim=10)
+        control['algoTypes']=[80]
+        SmartAnalyzeTransient(dt, npts, control)
+    
+    Example 5: run records in parallel
+        def buildModel(record, scale):
+            ops.model('basic', '-ndm', 2, '-ndf', 3)
+            ...  # build the model and the ground motion of record times scale
+            return dt, npts
+        jobs=[(record, scale) for record in records for scale in [0.5, 1.0, 1.5]]
+        results=SmartAnalyzeBatch(buildModel, jobs, control)
+        for result in results:
+            print(result['record'], result['scale'], result['status'], result['wallTime'])
+    
+    Example 6: build the model once and fork a process for each job
+        def prepare():
+            ...  # build the model and run gravity
+            ops.loadConst('-time', 0.0)
+        def runJob(job):
+            record, scale=job
+            ...  # add the ground motion of record times scale
+            return SmartAnalyzeTransient(dt, npts, control)
+        results=SmartAnalyzeForked(prepare, jobs, runJob)
+    
+    Example 7: incremental dynamic analysis by hunt and fill
+        curves=SmartAnalyzeIDA(buildModel, records, control, firstScale=0.2, maxRuns=10)
+        for curve in curves:
+            print(curve['record'], curve['capacity'], [run['scale'] for run in curve['runs']])
+    
+    Example 8: standard cyclic protocols
+        SmartAnalyzeStatic(node, dof, maxStep, fema461Protocol(0.15, 3.0))       # displacements
+        SmartAnalyzeStatic(node, dof, maxStep, sacProtocol(0.04, height=3000.0)) # story drift times height
+        SmartAnalyzeStatic(node, dof, maxStep, atc24Protocol(dy, 6))             # multiples of yield displacement
+        SmartAnalyzeStatic(node, dof, maxStep, cyclicProtocol([1, 2, 3], [3, 2, 2]))
+    
+    Example 9: gravity, then a ground motion, in a pipeline that can be resumed
+        def addGroundMotion():
+            ops.timeSeries('Path', 2, '-dt', dt, '-values', *accel)
+            ops.pattern('UniformExcitation', 2, 1, '-accel', 2)
+        stages=[{'type': 'loadControl', 'maxStep': 0.1},
+                {'type': 'loadConst', 'time': 0.0},
+                {'type': 'call', 'function': addGroundMotion},
+                {'type': 'transient', 'dt': dt, 'npts': npts, 'ud': {'stepControl': 'adaptive'}}]
+        results=SmartAnalyzePipeline(stages, {'pipelineCheckpoint': True})
+    
+    The work flow
+    ---------------------------------------------------------------------------
+        1. Start
+        2. Set initial step length, algorithm method and test (You don't need to specify them in your model.)
+        3. Divide the whole analysis into pieces. For Static, use maxStep. For Transient, use dt.
+        4. Loop by each piece and analyze recursively with RecursiveAnalyze, in the following way
+           (RecursiveAnalyze keeps the pending steps in a work stack instead of calling itself)
+            4.1 Trail analyze for one step, if converge, continue loop 4.
+            4.2 If not converge, if tryAddTestTimes is True, if the last test norm is smaller than normTol, recursively set a larger test time.
+            4.3 If not converge, if tryAlterAlgoTypes is True, recursively loop to the next algo type.
+            4.4 If not converge, divide the current step into two steps. The first one equals to the current step times relaxation.
+            4.5 If either step is smaller than minStep:
+                4.5.1 If tryLooseTestTol is True, loose test tolerance to looseTestTolTo.
+                4.5.2 Else, return not converge code. Exit.
+            4.6 If both steps are not smaller than minStep, divide the current piece into two and re-run loop 4.
+        5. If converge, return success message.
+        The ways to converge in 4.2 to 4.6 are recovery stages. Their order can be changed,
+        and other stages can be added, by `recoveryStages`.
+    
+    Control Parameters
+    ---------------------------------------------------------------------------
+    TEST RELATED:
+        `testType`        : string. Identical to the testType in OpenSees test command. Default is "EnergyIncr".
+                            Choices see http://opensees.berkeley.edu/wiki/index.php/Test_Command.
+        `testTol`         : float. The initial test tolerance set to the OpenSees test command. Default is 1.0e-6.
+                            If tryLooseTestTol is set to True, the test tolerance can be loosen.
+        `testIterTimes`   : integer. The initial number of test iteration times. Default is 7.
+                            If tryAddTestTimes is set to True, the number of test times can be enlarged.
+        `testPrintFlag`   : integer. The test print flag in OpenSees Test command. Default is 0.
+                            Choices see http://opensees.berkeley.edu/wiki/index.php/Test_Command.
+        `tryAddTestTimes` : boolean. Default is True If this is set to True, 
+                            the number of test times will be enlarged if the last test norm is smaller than `normTol`,
+                            the enlarged number is specified in `testIterTimesMore`.
+                            Otherwise, the number of test times will always be equal to `testIterTimes`.
+        `normTol`         : float. Only useful when tryAddTestTimes is True. Default is 1.0e3.
+                            If unconverge, the last norm of test will be compared to `normTol`.
+                            If the norm is smaller, the number of test times will be enlarged.
+        `testIterTimesMore` : integer. Only useful when tryaddTestTimes is True. Default is 50.
+                            If unconverge and norm is ok, the test iteration times will be set to this number.
+        `addTestTimesMode` : string. "threshold" or "trend". Only useful when tryAddTestTimes is True. Default is "threshold".
+                            If "threshold", the test times are enlarged to `testIterTimesMore` if the last norm is smaller than `normTol`.
+                            If "trend", the rate of convergence is estimated from the norms of the failed trial,
+                            and the test times are enlarged to the number of iterations predicted to reach `testTol`.
+                            They are not enlarged if the norms are not contracting,
+                            or if more than `testIterTimesMore` iterations are predicted.
+        `trendWindow`     : integer. Only useful when addTestTimesMode is "trend". Default is 3.
+                            The number of last norm ratios used to estimate the rate of convergence.
+        `trendMargin`     : float. Only useful when addTestTimesMode is "trend". Default is 1.5.
+                            The predicted number of iterations is multiplied by this factor.
+        `tryLooseTestTol` : boolean. If this is set to True, if unconverge at minimum step,
+                            the test tolerance will be loosen to the number specified by `looseTestTolTo`.
+                            the step will be set back.
+                            Default is True.
+        `looseTestTolTo`  : float. Only useful if tryLooseTestTol is True.
+                            If unconvergance at the min step, the test tolerance will be set to this value.
+                            Default is 1.0
+    
+    ALGORITHM RELATED:
+        `tryAlterAlgoTypes` : boolean. Default is False.
+                              If True, different algorithm types specified in `algoTypes` will be tried during unconvergance.
+                              If False, the first algorithm type specified in `algoTypes` will be used.
+        `algoTypes`         : list of integer. A list of flags of the algorithms to be used during unconvergance.
+                              The integer flag is documented in the following section.
+                              Only useful when tryAlterAlgoTypes is True.
+                              The first flag will be used by default.
+                              The algorithm command in the model will be ignored.
+                              Default is { 40 }
+                              If you need other algorithm, try a user-defined algorithm. See the following section.
+        `algoOrder`         : string. "static", "ucb" or "thompson". Default is "static".
+                              The order in which the algorithms are tried when tryAlterAlgoTypes is True.
+                              If "static", the order of `algoTypes` is used.
+                              If "ucb" or "thompson", the success rate and the time of every attempt of each algorithm
+                              are recorded, and at each failure the untried algorithm with the best success rate per
+                              unit time is chosen, by the upper confidence bound or by Thompson sampling.
+        `ucbFactor`         : float. Only useful when algoOrder is "ucb". Default is 1.0.
+                              The weight of exploration in the upper confidence bound.
+        `algoStatsFile`     : string. Default is "" (not saved).
+                              A json file to load the statistics of the algorithms from at the start,
+                              and save them to at the end, so the next run on a similar model starts with them.
+                              The statistics of a run are added to the file under a lock, so the runs
+                              of SmartAnalyzeBatch and SmartAnalyzeIDA can share it.
+        `algoPolicy`        : string. "reset" or "sticky". Default is "reset".
+                              If "reset", every new step (a new piece, a divided step, or a step with loosened tolerance)
+                              starts with the first algorithm in `algoTypes`.
+                              If "sticky", an algorithm that converges after the first one has failed is held,
+                              and new steps start with it until the hold expires. Then the first algorithm is tried again.
+                              A held algorithm that fails loses its hold.
+        `stickySteps`       : integer. Only useful when algoPolicy is "sticky". Default is 10.
+                              The hold expires after this number of converged steps. 0 to disable.
+        `stickyTime`        : float. Only useful when algoPolicy is "sticky". Default is 0.0 (disabled).
+                              The hold expires after this length of time (pseudo-time for Static).
+        `stickyBackoff`     : float. Only useful when algoPolicy is "sticky". Default is 2.0.
+                              If the first algorithm fails again at once after a hold, the next hold is longer by this factor.
+        
+    RECOVERY RELATED:
+        `recoveryStages`  : list. Default is None, which uses the stages chosen by `raceMode` and the `try-` flags
+                            in the order of the work flow above.
+                            The ways to converge tried in turn when a step does not converge, until one applies.
+                            The items are the names "race", "addTestTimes", "alterAlgoTypes", "switchTestType",
+                            "initialStiffness", "arcLength", "looseTestTol" and "divide", or RecoveryStage objects.
+                            A listed stage is used whatever the `try-` flags are.
+                            E.g. ["divide", "alterAlgoTypes", "looseTestTol"] divides the step first,
+                            and tries other algorithms only at the minimum step.
+                            The number of calls and the time of each stage are reported in
+                            SmartAnalyzeResult.strategyCalls and strategyTime.
+        `switchTestTypes` : list of string. Only useful with the "switchTestType" stage.
+                            Default is ["NormDispIncr", "NormUnbalance"]. The test types tried in turn, with the same tolerance.
+        `initialStiffnessAlgo` : integer. Only useful with the "initialStiffness" stage. Default is 31.
+                            The algorithm on the initial stiffness. It does not need to be in `algoTypes`.
+        
+    STATIC INTEGRATOR RELATED (Static only):
+        `integrator`      : string. "DisplacementControl", "LoadControl", "ArcLength" or "MinUnbalDispNorm".
+                            Set by SmartAnalyzeStatic, SmartAnalyzeLoadControl and SmartAnalyzeArcLength.
+        `autoArcLength`   : boolean. Only useful for "DisplacementControl". Default is False.
+                            If True, a step that still does not converge after `arcLengthAfter` divisions,
+                            e.g. near a limit point, is passed with the ArcLength integrator, which can follow a snap-back.
+                            The arc length steps go on until the displacement passes the end of the failed step,
+                            then the displacement control goes on. It adds the "arcLength" stage to the default `recoveryStages`.
+                            The ArcLength integrator of OpenSees starts with an increasing load factor,
+                            so the switch is not used when the load factor of the last converged step decreases,
+                            e.g. in a reverse half-cycle. Such a step is divided as usual.
+        `arcLengthAfter`  : integer. Only useful when autoArcLength is True. Default is 3.
+        `arcLength`       : float. Only useful when autoArcLength is True. Default is 0.0 (the length of the failed step).
+                            The arc length used after the switch. It is constant in the arc length steps of a switch,
+                            as a new ArcLength integrator loses the direction of the path. If a step does not converge,
+                            the other algorithms of `algoTypes` are tried with it.
+        `arcLengthAlpha`  : float. The alpha of the ArcLength integrator. Default is 1.0.
+        `arcLengthMaxSteps` : integer. Only useful when autoArcLength is True. Default is 100.
+                            The analysis fails if the displacement is not passed in this number of arc length steps.
+        
+    STEP RELATED:
+        `initialStep`     : float. Default is equal to $dt.
+                            Specifying the initial Step length to conduct analysis.
+        `relaxation`      : float, between 0 and 1. Default is 0.5.
+                            A factor that is multiplied by each time the step length is shortened.
+        `minStep`         : float. Default is 1.0e-6.
+                            The step tolerance when shortening the step length.
+                            If step length is smaller than minStep, special ways to converge the model will be used according to `try-` flags.
+        `stepControl`     : string. "fixed" or "adaptive". Default is "fixed".
+                            If "fixed", every piece is first tried at its full length.
+                            If "adaptive", a PI controller driven by `ops.testIter()` grows or shrinks the step length,
+                            and the last successful step length is carried to the next pieces and the rest of a divided step.
+        `targetIterTimes` : integer. Only useful when stepControl is "adaptive". Default is 4.
+                            The step grows if a step converges in less iterations, and shrinks if more,
+                            but not below `minStep`.
+        `growFactor`      : float. Only useful when stepControl is "adaptive". Default is 2.0.
+                            The maximum factor by which the step length grows after a converged step.
+        `shrinkFactor`    : float. Only useful when stepControl is "adaptive". Default is 0.5.
+                            The minimum factor by which the step length shrinks after a converged step.
+        `stepControlKI`   : float. Only useful when stepControl is "adaptive". Default is 0.3.
+                            The integral gain of the PI controller.
+        `stepControlKP`   : float. Only useful when stepControl is "adaptive". Default is 0.4.
+                            The proportional gain of the PI controller.
+    
+    BATCH RELATED (Transient only):
+        `batchMode`       : boolean. Default is False.
+                            If True, blocks of steps are analyzed in one `ops.analyze(k, dt)` call.
+                            The block size grows while blocks converge. If a block fails,
+                            the analysis continues step by step from the last converged step.
+        `batchInitSize`   : integer. The initial number of steps in a block. Default is 10.
+        `batchMaxSize`    : integer. The maximum number of steps in a block. Default is 1000.
+        `batchGrowFactor` : integer. The block size is multiplied by it after a converged block. Default is 2.
+        `batchCooldown`   : integer. The number of single steps analyzed after a failed block
+                            before a new block is tried. Default is 10.
+    
+    RACE RELATED:
+        `raceMode`        : boolean. Default is False. Only available on systems that support os.fork().
+                            If True, when a step does not converge, the strategies in `raceStrategies` are tried
+                            at the same time, each in a process forked from the last converged state.
+                            The first one that converges is used. If none converges, the step is divided as usual.
+        `raceStrategies`  : list of (algoType, stepFactor). Default is None, which tries the other algorithms in `algoTypes`
+                            at the full step and the first algorithm at the step times `relaxation`.
+        `raceWorkers`     : integer. The maximum number of strategies in a race. Default is 0 (the number of cores).
+    
+    CHECKPOINT RELATED:
+        `checkpointPer`   : integer. Save a checkpoint every several pieces. Default is 0 (never).
+        `checkpointInterval` : float. Save a checkpoint every several seconds of wall time. Default is 0 (never).
+        `checkpointDir`   : string. The directory of the checkpoint files. Default is "SmartAnalyzeCheckpoint".
+                            The domain is saved by the OpenSees `database File` and `save` commands,
+                            and the current status is saved to checkpoint.json.
+                            Call SmartAnalyzeTransient or SmartAnalyzeStatic with resume=True
+                            after building the same model to continue from the last checkpoint.
+                            A checkpoint is also saved at the last converged step if the analysis fails
+                            or exceeds `timeLimit`. If a divided step fails, the part of it that converged
+                            is kept, and only the rest is analyzed on resume.
+        `pipelineCheckpoint` : boolean. Only useful for SmartAnalyzePipeline. Default is False.
+                            If True, a checkpoint is saved in the "pipeline" directory of `checkpointDir` after each stage.
+                            The checkpoints of each stage are saved in its "stage<number>" directory.
+    
+    JOURNAL RELATED (Transient only):
+        `journalFile`     : string. Default is "" (not saved).
+                            A json file to save the journal of the converged steps to at the end: the time, step length,
+                            algorithm and test of each run of steps. Failed trials are not in it.
+        `replayFile`      : string. Default is "" (no replay).
+                            A journal saved by `journalFile`. If given, the analysis runs along its steps
+                            with no failed trials, e.g. to run the same model again with more recorders.
+                            The model must be the same. If a step does not converge, -1 is returned.
+        `warmStartFile`   : string. Default is "" (no warm start).
+                            A journal saved by `journalFile` of a similar analysis, e.g. the same record at the last
+                            intensity of an IDA. The windows of time where it needed shorter steps or other algorithms
+                            are started at once with the step length and the algorithm that converged there,
+                            instead of `initialStep` and the first algorithm. If the file does not exist, it is ignored,
+                            so the first run of a series can use the name of its own journal.
+    
+    TIME LIMIT:
+        `timeLimit`       : float. The maximum wall time in seconds. Default is 0 (no limit).
+                            If exceeded, the analysis is stopped and -2 is returned.
+                            It is also checked between the trials of a step, so a step that is divided
+                            many times cannot hold the analysis, e.g. a job of SmartAnalyzeBatch.
+    
+    SIGNIFICANT DURATION (Transient only):
+        `significantDuration` : (low, high). Default is None (analyze npts steps).
+                            Only useful if the ground acceleration is passed to SmartAnalyzeTransient by `accel`.
+                            The analysis ends when the Arias intensity of the record reaches the fraction high
+                            of its total, e.g. (0.05, 0.95) for the 5-95% significant duration, plus `freeVibration`.
+                            The npts argument is not used then. The record must start with the analysis.
+                            Only the tail is cut, and the fraction 1-high of the intensity is not applied. The peak response
+                            is usually in the significant duration, but the residual displacement may change
+                            if the tail or the free vibration is too short.
+        `freeVibration`   : float. Only useful with `significantDuration`. Default is 0.0.
+                            The time analyzed after the significant duration. Past the end of the record,
+                            the time series of OpenSees gives no load, so the structure vibrates freely.
+    
+    FREE VIBRATION RELATED (Transient only):
+        `decayNodes`      : list of (node, dof). Default is [] (analyze to the end).
+                            If given, the analysis finishes early as "success" once the free vibration has decayed,
+                            i.e. the excitation is negligible and the kinetic energy of the nodes, from ops.nodeMass
+                            and ops.nodeVel, stays below `decayTol` for `decayWindow`.
+                            The displacements of the nodes at the end are in SmartAnalyzeResult.residualDisp.
+        `decayNorm`       : a function with no argument that returns a response norm. Default is None.
+                            If given, it is used instead of the kinetic energy of `decayNodes`.
+        `decayTol`        : float. The norm below which the response has decayed. Default is 1.0e-6.
+        `decayWindow`     : float. The time the norm must stay below decayTol. Default is 1.0.
+                            It should be longer than the half period of the structure, as the velocity is zero
+                            at the peaks of the displacement.
+        `decayAfter`      : float. The time after which the excitation is negligible. Default is None,
+                            which is the time of the last point of the ground acceleration passed by `accel`
+                            larger than `decayAccelRatio` times its peak.
+        `decayAccelRatio` : float. Default is 0.01.
+        The norm is checked every `stopCheckPer` converged pieces.
+    
+    STOP CONDITIONS (Transient only):
+        `stopConditions`  : list. Default is [] (never stop early).
+                            The conditions of collapse. If one is met, the analysis is stopped and -3 is returned,
+                            with the status "collapsed". If the analysis does not converge when one is met, it is also
+                            "collapsed" instead of "failed". The items can be:
+                            ('disp', node, dof, limit): the absolute displacement of node reaches limit.
+                            ('drift', nodeI, nodeJ, dof, height, limit): the absolute displacement of nodeJ
+                                relative to nodeI, divided by height, reaches limit.
+                            a function with no argument that returns True to stop.
+        `stopCheckPer`    : integer. Check the conditions every several converged pieces. Default is 1.
+    
+    LOGGING RELATED:
+        `printPer`        : integer. Print to the console every several trials. Default is 10. 
+                            If `tqdm` is installed (packed in anaconda) defaults to 0 (use progress bar instead).
+        `debugMode`       : boolean. Print as much information as possible.
+        `showBanner`      : boolean. Print the banner at the start. Default is True.
+        `showControl`     : boolean. Print the control parameters at the start. Default is True.
+        The messages are written by the `logging` module to the logger named "SmartAnalyze".
+        Call setLogging(level, queued, logQueue) to change the level or use a queue-backed handler,
+        e.g. setLogging(logging.WARNING) to hide the messages of every way to converge.
+    
+    Algorithm type flag reference
+    ---------------------------------------------------------------------------
+     0:  Linear
+     1:  Linear -initial
+     2:  Linear -factorOnce
+    10:  Newton
+    11:  Newton -initial
+    12:  Newton -initialThenCurrent
+    20:  NewtonLineSearch
+    21:  NewtonLineSearch -type Bisection
+    22:  NewtonLineSearch -type Secant
+    23:  NewtonLineSearch -type RegulaFalsi
+    30:  ModifiedNewton
+    31:  ModifiedNewton -initial
+    40:  KrylovNewton
+    41:  KrylovNewton -iterate initial
+    42:  KrylovNewton -increment initial
+    43:  KrylovNewton -iterate initial -increment initial
+    44:  KrylovNewton -maxDim 6
+    50:  SecantNewton
+    51:  SecantNewton -iterate initial
+    52:  SecantNewton -increment initial 
+    53:  SecantNewton -iterate initial -increment initial
+    60:  BFGS
+    70:  Broyden    
+    80:  PeriodicNewton
+    90:  User-defined0
+    
+    About User-defined algoType:
+        If special algorithm is to be used, SmartAyalize provides 3 user-defined algorithms.
+        The script author should specify the algorithm as a procedure in the script.
+        The script name must be `UserAlgorithm0`, `UserAlgorithm1`, `UserAlgorithm2`.
+        Example see section Example No. 4.
+        
+    Change Log
+    ---------------------------------------------------------------------------
+    Mon Jun 29 16:10:18 2020 v0.0
+        Creat SmartAnalyze.py file.
+    Wed Feb 17 19:44:00 2021 v0.1
+        Change getCTestNorms() to testNorms()
+    Sun Feb 18 15:00:00 2023 v4.0.3
+        Improve output. Add a progress bar. 
+        Make version compatible to the tcl code.
+    Sun Oct 18 10:00:00 2026 v4.1.0
+        Add adaptive step control (`stepControl`).
+        Add optimistic batch mode for Transient (`batchMode`).
+        Add SmartAnalyzeBatch to run many records in a process pool. Add `timeLimit`.
+        Add SmartAnalyzeForked to run jobs in processes forked from a built model.
+        Add race mode to try the convergence strategies in parallel (`raceMode`).
+        RecursiveAnalyze runs on an explicit work stack instead of recursion.
+        Add checkpoints and the `resume` argument.
+        SmartAnalyzeTransient and SmartAnalyzeStatic return a SmartAnalyzeResult instead of -1 or None.
+        Print messages with the `logging` module. Add setLogging, `showBanner` and `showControl`.
+        Add performance counters (SmartAnalyzeResult.perf).
+        Add the sticky algorithm policy (`algoPolicy`).
+        Add adaptive ordering of the algorithms (`algoOrder`) with persistent statistics (`algoStatsFile`).
+        Make the ways to converge reorderable recovery stages (`recoveryStages`). Add the switchTestType
+        and initialStiffness stages. Report the time of each stage (SmartAnalyzeResult.strategyTime).
+        Add the trend mode of adding test times (`addTestTimesMode`).
+        Add the journal of the converged steps of Transient and the replay of it (`journalFile`, `replayFile`).
+        Add the warm start of Transient from the journal of a similar analysis (`warmStartFile`).
+        Add SmartAnalyzeIDA to run incremental dynamic analyses by hunt and fill.
+        Add the stop conditions of collapse of Transient (`stopConditions`) and the "collapsed" status.
+        Add the truncation of Transient at the end of the significant duration (`significantDuration`).
+        Add the early finish of Transient when the free vibration has decayed (`decayNodes`).
+        Compile the targets of Static by compileProtocol, with numpy if it is installed.
+        The steps hit the targets, and short sections are merged. The first target can be negative.
+        Read the targets of Static lazily from any iterable (streamProtocol). Show the progress of Static by distance.
+        Add the cyclic protocols cyclicProtocol, fema461Protocol, atc24Protocol and sacProtocol.
+        Add SmartAnalyzeLoadControl and SmartAnalyzeArcLength, and the switch to arc length of Static (`autoArcLength`).
+        Add SmartAnalyzePipeline to run stages with shared counters and checkpoints between them.
+        SmartAnalyzeBatch and SmartAnalyzeIDA run only the jobs that were running again when a worker crashes.
+"""
+
+version = "4.1.0"
+
+import openseespy.opensees as ops 
+import atexit
+import copy
+import functools
+import itertools
+import json
+import logging
+import logging.handlers
+import math
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import selectors
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+logger=logging.getLogger('SmartAnalyze')
+logListener=None
+
+
+def setLogging(level=logging.INFO, queued=False, logQueue=None, stream=None):
+    '''
+    level: the logging level. Messages below it are not formatted at all.
+        Use logging.WARNING to hide the messages of every way to converge,
+        and logging.DEBUG to also show every algorithm command.
+    queued: if True, the messages are put to a queue and written by a background thread,
+        so the analysis does not wait for the terminal or the pipe.
+    logQueue: if given, the messages are put to this queue, e.g. a multiprocessing.Queue
+        that is read in the parent process.
+    stream: the stream to write to. Default is sys.stdout.
+    The messages are written to sys.stdout at INFO level by default.
+    The logger is logging.getLogger('SmartAnalyze'), so it can also be configured directly.
+    '''
+    global logListener
+    stopLogListener()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.setLevel(level)
+    logger.propagate=False
+    
+    if logQueue is not None:
+        logger.addHandler(logging.handlers.QueueHandler(logQueue))
+        return
+    handler=logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    if queued:
+        localQueue=queue.SimpleQueue()
+        logListener=logging.handlers.QueueListener(localQueue, handler)
+        logListener.start()
+        handler=logging.handlers.QueueHandler(localQueue)
+    logger.addHandler(handler)
+
+
+def stopLogListener():
+    '''
+    Write the queued messages and stop the thread of the queued log handler.
+    '''
+    global logListener
+    if logListener is not None:
+        logListener.stop()
+        logListener=None
+
+
+if not logger.handlers:
+    setLogging()
+atexit.register(stopLogListener)
+
+has_tqdm = True
+try:
+    from tqdm import tqdm
+except ImportError:
+    logger.warning("""Warning: python module `tqdm` is not installed.""")
+    has_tqdm = False
+
+    class tqdm:
+        '''
+        Used in place of tqdm if it is not installed. Shows nothing.
+        '''
+        def __init__(self, iterable=None, **kwargs):
+            self.iterable=iterable
+        
+        def __iter__(self):
+            return iter(self.iterable)
+        
+        def update(self, n=1):
+            pass
+        
+        def close(self):
+            pass
+
+has_numpy = True
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+
+# the file lock of algoStatsFile. Not on Windows, where the file is not locked.
+has_fcntl = True
+try:
+    import fcntl
+except ImportError:
+    has_fcntl = False
+
+def defaultControl(analysis, initialStep):
+    '''
+    analysis: "Transient" or "Static"
+    initialStep: the default initial step length
+    Return a dict of the default control parameters.
+    '''
+    control={}
+    control['analysis']=analysis
+    control['integrator']="DisplacementControl"
+    control['testType']="EnergyIncr"
+    control['testTol']=1.0e-6
+    control['testIterTimes']=7
+    control['testPrintFlag']=0
+    control['tryAddTestTimes']=False
+    control['normTol']=1.0e3
+    control['testIterTimesMore']=50
+    control['addTestTimesMode']="threshold"
+    control['trendWindow']=3
+    control['trendMargin']=1.5
+    control['tryLooseTestTol']=False
+    control['looseTestTolTo']=1.0
+    control['tryAlterAlgoTypes']=False
+    control['algoTypes']=[40]
+    control['algoOrder']="static"
+    control['ucbFactor']=1.0
+    control['algoStatsFile']=""
+    control['algoPolicy']="reset"
+    control['stickySteps']=10
+    control['stickyTime']=0.0
+    control['stickyBackoff']=2.0
+    control['recoveryStages']=None
+    control['switchTestTypes']=["NormDispIncr", "NormUnbalance"]
+    control['initialStiffnessAlgo']=31
+    control['autoArcLength']=False
+    control['arcLengthAfter']=3
+    control['arcLength']=0.0
+    control['arcLengthAlpha']=1.0
+    control['arcLengthMaxSteps']=100
+    control['initialStep']=initialStep
+    control['relaxation']=0.5
+    control['minStep']=1.0e-6
+    control['stepControl']="fixed"
+    control['targetIterTimes']=4
+    control['growFactor']=2.0
+    control['shrinkFactor']=0.5
+    control['stepControlKI']=0.3
+    control['stepControlKP']=0.4
+    control['batchMode']=False
+    control['batchInitSize']=10
+    control['batchMaxSize']=1000
+    control['batchGrowFactor']=2
+    control['batchCooldown']=10
+    control['raceMode']=False
+    control['raceStrategies']=None
+    control['raceWorkers']=0
+    control['checkpointPer']=0
+    control['checkpointInterval']=0
+    control['checkpointDir']="SmartAnalyzeCheckpoint"
+    control['pipelineCheckpoint']=False
+    control['timeLimit']=0
+    control['stopConditions']=[]
+    control['significantDuration']=None
+    control['freeVibration']=0.0
+    control['decayNodes']=[]
+    control['decayNorm']=None
+    control['decayTol']=1.0e-6
+    control['decayWindow']=1.0
+    control['decayAfter']=None
+    control['decayAccelRatio']=0.01
+    control['stopCheckPer']=1
+    control['journalFile']=""
+    control['replayFile']=""
+    control['warmStartFile']=""
+    control['showBanner']=True
+    control['showControl']=True
+    control['printPer']=10 if not has_tqdm else 0
+    control['debugMode']=False
+    return control
+
+
+def defaultCurrent(control, maxStep):
+    '''
+    control: the control parameters of the analysis
+    maxStep: the maximum step length of the step controller
+    Return a dict of the current status at the start of an analysis.
+    '''
+    current={}
+    current['startTime']=time.time()
+    current['algoIndex']=0
+    current['testIterTimes']=control['testIterTimes']
+    current['testTol']=control['testTol']
+    current['counter']=0
+    current['analyzeCalls']=0
+    current['strategyCalls']={}
+    current['strategyTime']={}
+    current['minStepReached']=math.inf
+    current['algoType']=control['algoTypes'][0]
+    current['perf']=newPerf()
+    current['stickyIndex']=0
+    current['stickySteps']=0
+    current['stickyStart']=0.0
+    current['stickyScale']=1.0
+    current['stickyProbe']=False
+    current['triedAlgos']=set()
+    current['testType']=control['testType']
+    current['triedTestTypes']=set()
+    current['stages']=recoveryStages(control)
+    current['sameStepStrategies']={stage.name for stage in current['stages'] if stage.sameStep}
+    current['algoStats']=loadAlgoStats(control['algoStatsFile']) if control['algoStatsFile'] else {}
+    current['algoStatsSaved']=copyAlgoStats(current['algoStats'])
+    current['progress']=0
+    current['partial']=0.0
+    current['maxStep']=abs(maxStep)
+    current['adaptStep']=abs(control['initialStep'])
+    current['lastIter']=control['targetIterTimes']
+    return current
+
+
+def SmartAnalyzeTransient(dt, npts, ud=None, resume=False, accel=None, accelDt=None, shared=None):
+    '''
+    dt: delta t
+    npts: number of points
+    ud: change the control parameters in control dict
+    resume: if True, continue from the last checkpoint in control['checkpointDir']
+    accel: the ground acceleration of the record, used by `significantDuration`
+    accelDt: the time step of accel. Default is dt.
+    shared: the state shared by the stages of SmartAnalyzePipeline
+    Return a SmartAnalyzeResult.
+    '''
+    # default control parameters
+    control=defaultControl("Transient", dt)
+    
+    # set user control parameters
+    if ud is not None:
+        userControl=ud                                      
+        control.update(userControl)
+    
+    # cut the tail of the record after the significant duration.
+    if accel is not None and control['significantDuration']:
+        npts=significantNpts(accel, accelDt or dt, dt, control)
+    if control['showBanner']:
+        printBanner()
+    if control['showControl'] and logger.isEnabledFor(logging.INFO):
+        logger.info("Control parameters:")
+        for key,value in control.items():
+            logger.info("%s %s", key, value)
+    
+    # initialize analyze commands
+    setupAnalysis(control, shared)
+    
+    # set an array to store current status.
+    current=defaultCurrent(control, control['initialStep'])
+    current['segs']=npts
+    current['journal']=[] if control['journalFile'] else None
+    current['warmMap']=loadDifficultyMap(control['warmStartFile'], control) if control['warmStartFile'] else []
+    decay=bool(control['decayNodes'] or control['decayNorm'])
+    if decay:
+        current['quietTime']=quietTime(accel, accelDt or dt, control)
+        current['decayStart']=None
+    
+    # carry the counters and the step controller over from the last stages of a pipeline.
+    if shared is not None:
+        loadHandoff(control, current, shared)
+    
+    # run along the converged steps of a journal.
+    if control['replayFile']:
+        ok=replayJournal(control['replayFile'], control, current)
+        logger.info(">>> SmartAnalyze: Replay finished. Time consumption: %f s.", time.time()-current['startTime'])
+        return makeResult(ok, control, current)
+    
+    # continue from the last checkpoint
+    if resume:
+        loadCheckpoint(control, current)
+    
+    # divide the whole process into segments.
+    pbar=tqdm(total=npts, initial=current['progress'], desc="SmartAnalysisProgress", position=0)
+    batchSize=control['batchInitSize']
+    cooldown=0
+    seg=current['progress']
+    lastCheck=seg
+    while seg<npts:
+        k=min(batchSize, npts-seg)
+        if current['warmMap']:
+            # do not run a block into a hard window of the warm start.
+            k=min(k, warmFreeSteps(control['initialStep'], current))
+        if control['batchMode'] and cooldown==0 and k>1 and not current['partial']:
+            # optimistic batch: analyze a block of steps in one call.
+            ok, done=batchAnalyze(k, control, current)
+            if ok==0:
+                batchSize=min(batchSize*control['batchGrowFactor'], control['batchMaxSize'])
+            else:
+                # the converged steps of the block are committed. Continue step by step.
+                logger.info(">>> SmartAnalyze: Batch of %i steps failed after %i steps. Falling back to single steps.", k, done)
+                batchSize=control['batchInitSize']
+                cooldown=control['batchCooldown']
+        else:
+            current['segmentDone']=0.0
+            items=None if current['partial'] else warmStartItems(control['initialStep'], control['testIterTimes'], control['testTol'], control, current)
+            if items is not None:
+                ok=analyzeStack(items, control, current)
+            else:
+                # finish the rest of the step that failed before the checkpoint.
+                ok=marchSegment(control['initialStep']-current['partial'],control['testIterTimes'],control['testTol'],control,current)
+            # if not converge, break the loop and print information.
+            if ok<0:
+                pbar.close()
+                # the sub-steps of the step that converged are committed.
+                current['partial']+=current['segmentDone']
+                if ok==-2:
+                    if checkpointEnabled(control):
+                        saveCheckpoint(control, current)
+                    logger.warning(">>> SmartAnalyze: Time limit exceeded. Time consumption: %f s.", time.time()-current['startTime'])
+                    return makeResult(-2, control, current)
+                # a run that fails past a stop condition has collapsed.
+                if control['stopConditions'] and checkStop(control, current):
+                    logger.warning(">>> SmartAnalyze: Collapsed (%s). Time consumption: %f s.", current['stopReason'], time.time()-current['startTime'])
+                    return makeResult(-3, control, current)
+                if checkpointEnabled(control):
+                    saveCheckpoint(control, current)
+                logger.warning(">>> SmartAnalyze: Analyze failed. Time consumption: %f s.", time.time()-current['startTime'])
+                return makeResult(ok, control, current)
+            done=1
+            current['partial']=0.0
+            cooldown=max(cooldown-1, 0)
+        
+        # converged, update progress
+        seg+=done
+        current['progress']=seg
+        pbar.update(done)
+        
+        # show progress
+        if control['debugMode']:
+            logger.info("*** SmartAnalyze: progress %f", progressFraction(current))
+        
+        # stop if a stop condition is met, or the free vibration has decayed.
+        if (control['stopConditions'] or decay) and seg-lastCheck>=control['stopCheckPer']:
+            lastCheck=seg
+            if control['stopConditions'] and checkStop(control, current):
+                pbar.close()
+                logger.warning(">>> SmartAnalyze: Collapsed (%s). Time consumption: %f s.", current['stopReason'], time.time()-current['startTime'])
+                return makeResult(-3, control, current)
+            if decay and checkDecay(control, current):
+                pbar.close()
+                logger.info(">>> SmartAnalyze: Finished in free vibration (%s). Time consumption: %f s.", current['stopReason'], time.time()-current['startTime'])
+                return makeResult(0, control, current)
+        
+        if needCheckpoint(control, current):
+            saveCheckpoint(control, current)
+        
+        # stop if the time limit is exceeded.
+        if control['timeLimit']>0 and time.time()-current['startTime']>control['timeLimit']:
+            pbar.close()
+            if checkpointEnabled(control):
+                saveCheckpoint(control, current)
+            logger.warning(">>> SmartAnalyze: Time limit exceeded. Time consumption: %f s.", time.time()-current['startTime'])
+            return makeResult(-2, control, current)
+    pbar.close()
+    
+    # the analysis is done.
+    logger.info(">>> SmartAnalyze: Successfully finished! Time consumption: %f s.", time.time()-current['startTime'])
+    return makeResult(0, control, current)
+
+
+def significantDuration(accel, dt, low=0.05, high=0.95):
+    '''
+    accel: the ground acceleration
+    dt: the time step of accel
+    Return the times when the Arias intensity reaches the fractions low and high of its total.
+    '''
+    # the Arias intensity is proportional to the integral of the squared acceleration.
+    arias=0.0
+    cumulative=[]
+    for a in accel:
+        arias+=a*a*dt
+        cumulative.append(arias)
+    if arias==0.0:
+        return 0.0, 0.0
+    start=next(i for i, value in enumerate(cumulative) if value>=low*arias)
+    end=next(i for i, value in enumerate(cumulative) if value>=high*arias)
+    return (start+1)*dt, (end+1)*dt
+
+
+def significantNpts(accel, accelDt, dt, control):
+    '''
+    Return the number of steps of dt to the end of the significant duration of accel
+    in `significantDuration`, plus `freeVibration`.
+    '''
+    low, high=control['significantDuration']
+    start, end=significantDuration(accel, accelDt, low, high)
+    npts=int(math.ceil((end+control['freeVibration'])/dt-1.0e-9))
+    logger.info(">>> SmartAnalyze: Significant duration from %f s to %f s. Analyze %i steps to %f s.", start, end, npts, npts*dt)
+    return npts
+
+
+def quietTime(accel, dt, control):
+    '''
+    Return the time after which the excitation is negligible: `decayAfter`, or the time of the last
+    point of accel larger than `decayAccelRatio` times its peak.
+    '''
+    if control['decayAfter'] is not None:
+        return control['decayAfter']
+    if accel is None:
+        raise ValueError("SmartAnalyze: `decayAfter` or the ground acceleration is needed to detect the free vibration.")
+    peak=max(abs(a) for a in accel)
+    last=max((i for i, a in enumerate(accel) if abs(a)>=control['decayAccelRatio']*peak), default=-1)
+    return (last+1)*dt
+
+
+def checkDecay(control, current):
+    '''
+    Return True and set current['stopReason'] if the excitation is negligible, and the response norm
+    has been smaller than `decayTol` for `decayWindow` of time.
+    The norm is `decayNorm()`, or the kinetic energy of `decayNodes`.
+    '''
+    now=ops.getTime()
+    if now<current['quietTime']:
+        return False
+    if control['decayNorm']:
+        norm=control['decayNorm']()
+    else:
+        norm=sum(0.5*ops.nodeMass(node, dof)*ops.nodeVel(node, dof)**2 for node, dof in control['decayNodes'])
+    if norm>=control['decayTol']:
+        current['decayStart']=None
+        return False
+    if current['decayStart'] is None:
+        current['decayStart']=now
+    if now-current['decayStart']<control['decayWindow']:
+        return False
+    current['stopReason']="decayed at %f s" %(now)
+    return True
+
+
+def checkStop(control, current):
+    '''
+    Check the conditions of `stopConditions` in turn.
+    Return True and set current['stopReason'] if one is met.
+    '''
+    for condition in control['stopConditions']:
+        if callable(condition):
+            if condition():
+                current['stopReason']=getattr(condition, '__name__', 'callback')
+                return True
+            continue
+        if condition[0]=='disp':
+            node, dof, limit=condition[1:]
+            value=abs(ops.nodeDisp(node, dof))
+        elif condition[0]=='drift':
+            nodeI, nodeJ, dof, height, limit=condition[1:]
+            value=abs(ops.nodeDisp(nodeJ, dof)-ops.nodeDisp(nodeI, dof))/height
+        else:
+            raise ValueError("SmartAnalyze: Unknown stop condition %r." %(condition,))
+        if value>=limit:
+            current['stopReason']="%s %f >= %f" %(condition[0], value, limit)
+            return True
+    return False
+
+
+def SmartAnalyzeStatic(node, dof, maxStep, targets, ud='', resume=False, increments=False, totalDistance=None, shared=None):
+    '''
+    node: the node tag in the displacement control
+    dof: the dof in the displacement control
+    maxStep: the maximum step length in the displacement control
+    targets: a list of target displacements from the start position.
+        It can also be any iterable, e.g. a generator, which is read lazily by streamProtocol.
+    ud: change the control parameters in control dict
+    resume: if True, continue from the last checkpoint in control['checkpointDir']
+    increments: if True, targets are the increments between the targets
+    totalDistance: the total distance of an iterable of targets, used for the progress.
+        It is computed for a list.
+    shared: the state shared by the stages of SmartAnalyzePipeline
+    Return a SmartAnalyzeResult.
+    The integrator is DisplacementControl, unless control['integrator'] is set,
+    see SmartAnalyzeLoadControl and SmartAnalyzeArcLength.
+    '''
+    # default control parameters
+    control=defaultControl("Static", maxStep)
+    
+    # set user control parameters
+    if ud!='' and ud is not None:
+        userControl=ud
+        control.update(userControl)
+    
+    # divide the whole process into segments.
+    if hasattr(targets, '__len__'):
+        segs=compileProtocol(targets, maxStep, control['minStep'], increments)
+        totalDistance=float(np.abs(segs).sum()) if has_numpy else sum(abs(seg) for seg in segs)
+        initialStep=float(segs[0]) if len(segs) else maxStep
+    else:
+        # read the protocol lazily. Only the first step is read here.
+        segs=streamProtocol(targets, maxStep, control['minStep'], increments)
+        first=next(segs, None)
+        initialStep=first if first is not None else maxStep
+        segs=itertools.chain([first] if first is not None else [], segs)
+    control['initialStep']=initialStep
+    if control['showBanner']:
+        printBanner()
+    if control['showControl'] and logger.isEnabledFor(logging.INFO):
+        logger.info("Control parameters:")
+        for key,value in control.items():
+            logger.info("%s %s", key, value)
+    
+    # initialize analyze commands
+    setupAnalysis(control, shared, integratorArgs(control['integrator'], initialStep, node, dof, control))
+    
+    # set an array to store current status.
+    current=defaultCurrent(control, maxStep)
+    current['step']=initialStep
+    current['integrator']=control['integrator']
+    current['node']=node
+    current['dof']=dof
+    
+    # the number of segments is not known for a stream.
+    current['segs']=len(segs) if hasattr(segs, '__len__') else None
+    current['distance']=0.0
+    current['totalDistance']=totalDistance
+    
+    # carry the counters and the step controller over from the last stages of a pipeline.
+    if shared is not None:
+        loadHandoff(control, current, shared)
+    
+    # continue from the last checkpoint
+    if resume:
+        loadCheckpoint(control, current)
+    
+    # Run recursive analysis
+    pbar=tqdm(total=totalDistance, initial=current['distance'], desc="SmartAnalysisProgress", position=0)
+    for seg in itertools.islice(segs, current['progress'], None):
+        seg=float(seg)
+        current['segmentDone']=0.0
+        # finish the rest of the segment that failed before the checkpoint.
+        ok=marchSegment(seg-current['partial'], control['testIterTimes'], control['testTol'], control, current)
+        if ok<0:               
+            pbar.close()
+            # the sub-steps of the segment that converged are committed.
+            current['partial']+=current['segmentDone']
+            if checkpointEnabled(control):
+                saveCheckpoint(control, current)
+            if ok==-2:
+                logger.warning(">>> SmartAnalyze: Time limit exceeded. Time consumption: %f s.", time.time()-current['startTime'])
+            else:
+                logger.warning(">>> SmartAnalyze: Analyze failed. Time consumption: %f s.", time.time()-current['startTime'])
+            return makeResult(ok, control, current)
+        # converge
+        current['progress']+=1
+        current['partial']=0.0
+        current['distance']+=abs(seg)
+        pbar.update(abs(seg))
+        
+        if control['debugMode']:
+            logger.info("*** SmartAnalyze: progress %f", progressFraction(current))
+        
+        if needCheckpoint(control, current):
+            saveCheckpoint(control, current)
+        
+        if control['timeLimit']>0 and time.time()-current['startTime']>control['timeLimit']:
+            pbar.close()
+            if checkpointEnabled(control):
+                saveCheckpoint(control, current)
+            logger.warning(">>> SmartAnalyze: Time limit exceeded. Time consumption: %f s.", time.time()-current['startTime'])
+            return makeResult(-2, control, current)
+    pbar.close()
+
+    logger.info(">>> SmartAnalyze: Successfully Finished! Time consumption: %f s.", time.time()-current['startTime'])
+    return makeResult(0, control, current)
+    
+    
+    
+    
+    
+
+def progressFraction(current):
+    '''
+    Return the fraction of the analysis that is done. It is by the distance for Static,
+    and by the pieces for Transient. It is nan for a stream of targets with no totalDistance.
+    '''
+    if current.get('totalDistance'):
+        return current['distance']/current['totalDistance']
+    if current['segs'] is None:
+        return math.nan
+    return current['progress']/current['segs'] if current['segs'] else 1.0
+
+
+def streamProtocol(targets, maxStep, minStep=0.0, increments=False):
+    '''
+    Yield the step lengths of compileProtocol one by one from any iterable of targets,
+    so a protocol of any length is not held in memory.
+    increments: if True, targets yields the increments between the targets instead.
+    '''
+    maxStep=abs(maxStep)
+    last=0.0
+    section=0.0
+    for value in targets:
+        # an increment is used as it is, so equal increments give equal steps.
+        section=section+value if increments else value-last
+        # merge the sections shorter than minStep into the next.
+        if section==0 or abs(section)<minStep:
+            continue
+        count=max(int(math.ceil(abs(section)/maxStep-1.0e-9)), 1)
+        size=section/count
+        for k in range(1, count):
+            yield size
+        yield section-size*(count-1)
+        last=last+section if increments else value
+        section=0.0
+
+
+def SmartAnalyzeLoadControl(maxStep, targets=(1.0,), ud='', resume=False, shared=None):
+    '''
+    maxStep: the maximum load factor increment
+    targets: a list of target load factors from the start. Default is (1.0,), e.g. for gravity.
+    ud: change the control parameters in control dict
+    resume: if True, continue from the last checkpoint in control['checkpointDir']
+    shared: the state shared by the stages of SmartAnalyzePipeline
+    Run SmartAnalyzeStatic with the LoadControl integrator. Return a SmartAnalyzeResult.
+    '''
+    control=dict(ud) if ud!='' and ud is not None else {}
+    control['integrator']="LoadControl"
+    return SmartAnalyzeStatic(None, None, maxStep, targets, control, resume, shared=shared)
+
+
+def SmartAnalyzeArcLength(arcLength, numSteps, ud='', resume=False, method="ArcLength", shared=None):
+    '''
+    arcLength: the arc length. For "MinUnbalDispNorm", the first load factor increment.
+    numSteps: the number of steps
+    ud: change the control parameters in control dict
+    resume: if True, continue from the last checkpoint in control['checkpointDir']
+    method: "ArcLength" or "MinUnbalDispNorm"
+    shared: the state shared by the stages of SmartAnalyzePipeline
+    Run numSteps steps with the ArcLength or MinUnbalDispNorm integrator, e.g. to follow a snap-back.
+    The integrator is set once with the constant arc length, as a new one loses the direction of the path.
+    So a step that does not converge is recovered like a step of SmartAnalyzeStatic, but not divided.
+    Return a SmartAnalyzeResult.
+    '''
+    control=dict(ud) if ud!='' and ud is not None else {}
+    control['integrator']=method
+    return SmartAnalyzeStatic(None, None, arcLength, itertools.repeat(arcLength, numSteps), control, resume,
+                              increments=True, totalDistance=arcLength*numSteps, shared=shared)
+
+
+def integratorArgs(integrator, step, node, dof, control):
+    '''
+    Return the arguments of ops.integrator for the static integrator with the step length.
+    '''
+    if integrator=='DisplacementControl':
+        return ('DisplacementControl', node, dof, step)
+    if integrator=='LoadControl':
+        return ('LoadControl', step)
+    if integrator=='ArcLength':
+        return ('ArcLength', step, control['arcLengthAlpha'])
+    if integrator=='MinUnbalDispNorm':
+        return ('MinUnbalDispNorm', step)
+    raise ValueError("SmartAnalyze: Unknown integrator %r." %(integrator,))
+
+
+def compileProtocol(targets, maxStep, minStep=0.0, increments=False):
+    '''
+    targets: a list of target displacements from the start position
+    maxStep: the maximum step length
+    minStep: a target closer than it to the last one is merged into the next target,
+        or dropped if it is the last one.
+    increments: if True, targets are the increments between the targets. Each increment is used
+        as it is, so equal increments give equal steps.
+    Return the step lengths of SmartAnalyzeStatic: each section between two targets is divided
+    into equal steps not longer than maxStep. The last step of a section takes up the rounding error,
+    so the section ends at the target and the errors do not add up. The other steps are exactly equal,
+    so the integrator is not set again for them.
+    The result is a read-only numpy array, or a tuple if numpy is not installed.
+    It is cached, so a protocol used by many analyses is compiled once.
+    '''
+    return compileProtocolCached(tuple(float(target) for target in targets), float(abs(maxStep)), float(minStep), bool(increments))
+
+
+@functools.lru_cache(maxsize=32)
+def compileProtocolCached(targets, maxStep, minStep, increments):
+    '''
+    compileProtocol on a tuple of targets.
+    '''
+    # merge the sections shorter than minStep into the next.
+    sections=[]
+    last=0.0
+    section=0.0
+    for value in targets:
+        section=section+value if increments else value-last
+        if section==0 or abs(section)<minStep:
+            continue
+        sections.append(section)
+        last=last+section if increments else value
+        section=0.0
+    
+    if has_numpy:
+        sections=np.array(sections)
+        counts=np.maximum(np.ceil(np.abs(sections)/maxStep-1.0e-9).astype(int), 1)
+        ends=np.cumsum(counts)
+        index=np.repeat(np.arange(len(sections)), counts)
+        sizes=sections/counts
+        steps=sizes[index]
+        steps[ends-1]=sections-sizes*(counts-1)
+        steps.flags.writeable=False
+        return steps
+    
+    steps=[]
+    for section in sections:
+        count=max(int(math.ceil(abs(section)/maxStep-1.0e-9)), 1)
+        size=section/count
+        steps.extend([size]*(count-1))
+        steps.append(section-size*(count-1))
+    return tuple(steps)
+
+
+def cyclicProtocol(amplitudes, cycles=2):
+    '''
+    amplitudes: a list of amplitudes
+    cycles: the number of cycles of each amplitude, an integer or a list like amplitudes
+    Return the targets of a cyclic protocol for SmartAnalyzeStatic: each cycle goes to +amplitude
+    and -amplitude, and the protocol ends at 0. The targets are a read-only numpy array,
+    or a tuple if numpy is not installed. They are cached by the arguments.
+    '''
+    if not isinstance(cycles, int):
+        cycles=tuple(cycles)
+    return cyclicProtocolCached(tuple(float(amplitude) for amplitude in amplitudes), cycles)
+
+
+@functools.lru_cache(maxsize=32)
+def cyclicProtocolCached(amplitudes, cycles):
+    '''
+    cyclicProtocol on a tuple of amplitudes.
+    '''
+    if isinstance(cycles, int):
+        cycles=(cycles,)*len(amplitudes)
+    if has_numpy:
+        peaks=np.repeat(np.array(amplitudes), 2*np.array(cycles, dtype=int))
+        signs=np.resize(np.array([1.0, -1.0]), len(peaks))
+        targets=np.append(peaks*signs, 0.0)
+        targets.flags.writeable=False
+        return targets
+    targets=[]
+    for amplitude, count in zip(amplitudes, cycles):
+        targets.extend([amplitude, -amplitude]*count)
+    targets.append(0.0)
+    return tuple(targets)
+
+
+def geometricAmplitudes(first, last, growth, merge=0.1):
+    '''
+    Return the amplitudes from first, multiplied by growth, up to last. last is always included.
+    merge: an amplitude closer to last than merge times last is replaced by last,
+        so there is no level of cycles with a tiny increment. Default is 0.1.
+    '''
+    amplitudes=[]
+    amplitude=first
+    while amplitude<last*(1-1.0e-9):
+        amplitudes.append(amplitude)
+        amplitude*=growth
+    if amplitudes and amplitudes[-1]>last*(1-merge):
+        amplitudes[-1]=last
+    else:
+        amplitudes.append(last)
+    return amplitudes
+
+
+@functools.lru_cache(maxsize=32)
+def fema461Protocol(first, target, last=None, growth=1.4, cycles=2):
+    '''
+    first: the smallest amplitude
+    target: the amplitude at which the last damage state is expected
+    last: the largest amplitude. Default is target.
+    growth: the factor between two amplitudes. Default is 1.4.
+    cycles: the number of cycles of each amplitude. Default is 2.
+    Return the targets of the FEMA 461 quasi-static cyclic protocol: the amplitude grows by growth
+    from first to target, then by 0.3 times target up to last.
+    '''
+    amplitudes=geometricAmplitudes(first, target, growth)
+    last=target if last is None else last
+    k=1
+    while target+0.3*target*k<=last*(1+1.0e-9):
+        amplitudes.append(target+0.3*target*k)
+        k+=1
+    return cyclicProtocol(amplitudes, cycles)
+
+
+@functools.lru_cache(maxsize=32)
+def atc24Protocol(yieldDisp, ductility):
+    '''
+    yieldDisp: the yield displacement
+    ductility: the largest amplitude in multiples of yieldDisp
+    Return the targets of the ATC-24 protocol: 3 cycles at 0.5 and 0.75 times yieldDisp (6 elastic cycles),
+    3 cycles at 1, 2 and 3 times yieldDisp, then 2 cycles at each next multiple of yieldDisp.
+    '''
+    amplitudes=[0.5, 0.75]+list(range(1, int(ductility)+1))
+    cycles=[3 if amplitude<=3 else 2 for amplitude in amplitudes]
+    return cyclicProtocol([amplitude*yieldDisp for amplitude in amplitudes], cycles)
+
+
+@functools.lru_cache(maxsize=32)
+def sacProtocol(maxDrift, height=1.0):
+    '''
+    maxDrift: the largest story drift ratio
+    height: the story height. The targets are the drift ratios times it.
+    Return the targets of the SAC / AISC 341 protocol of beam-to-column connections:
+    6 cycles at 0.00375, 0.005 and 0.0075, 4 cycles at 0.01, 2 cycles at 0.015, 0.02 and 0.03,
+    then 2 cycles at each next 0.01, up to maxDrift.
+    '''
+    drifts=[0.00375, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03]
+    cycles=[6, 6, 6, 4, 2, 2, 2]
+    while drifts[-1]+0.01<=maxDrift*(1+1.0e-9):
+        drifts.append(round(drifts[-1]+0.01, 10))
+        cycles.append(2)
+    count=len([drift for drift in drifts if drift<=maxDrift*(1+1.0e-9)])
+    return cyclicProtocol([drift*height for drift in drifts[:count]], cycles[:count])
+
+
+class SmartAnalyzeResult:
+    '''
+    The result of SmartAnalyzeTransient and SmartAnalyzeStatic.
+    status: "success", "failed", "timeout" or "collapsed"
+    ok: the ok code. 0 for success, -1 for not converged, -2 for time limit exceeded,
+        -3 for stopped by `stopConditions`.
+    progress: the fraction of the pieces that are analyzed, of the distance for Static.
+        None for a stream of targets with no totalDistance.
+    wallTime: the wall time in seconds. For a stage of SmartAnalyzePipeline, it adds up from the start
+        of the pipeline, like the counters.
+    analyzeCalls: the number of ops.analyze calls
+    segments: the number of pieces, None for a stream of targets
+    strategyCalls: a dict of the number of ops.analyze calls made by each way to converge
+    strategyTime: a dict of the wall time in seconds spent by each way to converge,
+        in its ops.analyze calls and in the recovery stage itself (e.g. the race)
+    minStep: the minimum step length that is tried
+    failTime: the time (pseudo-time for Static) of the domain when the analysis fails, else None
+    failWallTime: the wall time in seconds when the analysis fails, else None
+    stopReason: the condition of `stopConditions` that stopped the analysis,
+        or the time the free vibration decayed (see `decayNodes`), else None
+    residualDisp: a dict {(node, dof): displacement} of `decayNodes` at the end, else None
+    perf: a dict of performance counters, see newPerf. perf['otherTime'] is the
+        wall time spent out of ops.analyze and the reconfiguration, i.e. in Python.
+    The result compares like the ok code, so `if ok<0` in old scripts still works.
+    '''
+    __slots__=('status', 'ok', 'progress', 'wallTime', 'analyzeCalls', 'segments',
+               'strategyCalls', 'strategyTime', 'minStep', 'failTime', 'failWallTime', 'stopReason', 'residualDisp', 'perf')
+    
+    def __init__(self, **kwargs):
+        for key in self.__slots__:
+            setattr(self, key, kwargs.get(key))
+    
+    def __repr__(self):
+        return "SmartAnalyzeResult(%s)" %(", ".join("%s=%r" %(key, getattr(self, key)) for key in self.__slots__))
+    
+    def asDict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+    
+    def __int__(self):
+        return self.ok
+    
+    def __lt__(self, other):
+        return self.ok<other
+    
+    def __le__(self, other):
+        return self.ok<=other
+    
+    def __gt__(self, other):
+        return self.ok>other
+    
+    def __ge__(self, other):
+        return self.ok>=other
+    
+    def __eq__(self, other):
+        if isinstance(other, SmartAnalyzeResult):
+            return self.asDict()==other.asDict()
+        return self.ok==other
+    
+    def __ne__(self, other):
+        return not self==other
+    
+    def __hash__(self):
+        return hash(self.ok)
+
+
+def setupAnalysis(control, shared, integrator=None):
+    '''
+    integrator: the arguments of ops.integrator for Static
+    Set the test, the first algorithm, the integrator and the analysis.
+    In SmartAnalyzePipeline, the commands that are the same as the last stage left them are not set again,
+    so the stages share one analysis.
+    '''
+    config=shared.get('config', {}) if shared is not None else {}
+    test=(control['testType'], control['testTol'], control['testIterTimes'], control['testPrintFlag'])
+    if config.get('test')!=test:
+        ops.test(*test)
+    if config.get('algoType')!=control['algoTypes'][0]:
+        setAlgorithm(control['algoTypes'][0])
+    if integrator is not None and config.get('integrator')!=integrator:
+        ops.integrator(*integrator)
+    if config.get('analysis')!=control['analysis']:
+        ops.analysis(control['analysis'])
+
+
+def makeResult(ok, control, current):
+    '''
+    Make a SmartAnalyzeResult from the ok code and the current status.
+    The statistics of the algorithms are saved to `algoStatsFile`, and the journal to `journalFile` here.
+    The state shared by the stages of a pipeline is updated here.
+    '''
+    if control['algoStatsFile']:
+        saveAlgoStats(control['algoStatsFile'], current['algoStats'], current['algoStatsSaved'])
+        current['algoStatsSaved']=copyAlgoStats(current['algoStats'])
+    if current.get('journal') is not None:
+        saveJournal(control['journalFile'], ok, control, current)
+    # the counters of the stages of a pipeline add up, and so does the wall time.
+    wallTime=time.time()-current['startTime']+current.get('pipelineWallTime', 0.0)
+    if current.get('shared') is not None:
+        saveHandoff(wallTime, control, current)
+
+    result=SmartAnalyzeResult()
+    result.ok=ok
+    result.status={0: 'success', -2: 'timeout', -3: 'collapsed'}.get(ok, 'failed')
+    result.stopReason=current.get('stopReason')
+    if control['decayNodes']:
+        result.residualDisp={(node, dof): ops.nodeDisp(node, dof) for node, dof in control['decayNodes']}
+    result.progress=progressFraction(current)
+    if math.isnan(result.progress):
+        result.progress=None
+    result.wallTime=wallTime
+    result.analyzeCalls=current['analyzeCalls']
+    result.segments=current['segs']
+    result.strategyCalls=dict(current['strategyCalls'])
+    result.strategyTime=dict(current['strategyTime'])
+    result.minStep=current['minStepReached'] if current['minStepReached']<math.inf else None
+    if ok<0:
+        result.failTime=ops.getTime()
+        result.failWallTime=result.wallTime
+    result.perf=copy.deepcopy(current['perf'])
+    result.perf['otherTime']=result.wallTime-result.perf['analyzeTime']-result.perf['configTime']
+    return result
+
+
+def SmartAnalyzePipeline(stages, ud=None, resume=False):
+    '''
+    stages: a list of dicts, each with a 'type' and the arguments of the stage:
+        {'type': 'loadControl', 'maxStep', 'targets'}: SmartAnalyzeLoadControl, e.g. gravity
+        {'type': 'static', 'node', 'dof', 'maxStep', 'targets'}: SmartAnalyzeStatic
+        {'type': 'arcLength', 'arcLength', 'numSteps', 'method'}: SmartAnalyzeArcLength
+        {'type': 'transient', 'dt', 'npts'}: SmartAnalyzeTransient
+        {'type': 'loadConst', 'time'}: ops.loadConst, setting the time if 'time' is given
+        {'type': 'call', 'function'}: call function(), e.g. to add a load pattern
+        The other keyword arguments of the drivers can be given too. The analysis stages may have
+        a 'ud' of their own control parameters, which update ud.
+    ud: change the control parameters in control dict, for all stages
+    resume: if True, continue from the checkpoint after the last finished stage, see `pipelineCheckpoint`.
+        The stage after it is resumed from its own checkpoint if it has one.
+    Run the stages one after another on the same model. The stages share the analysis counters
+    (analyzeCalls, strategyCalls, strategyTime, perf and the algorithm statistics) and the state of the
+    step controller, so the counters and the wall time of each result add up from the start of the pipeline.
+    The stages share one analysis: a stage sets only the analyze commands that differ from those
+    the last stage left, see setupAnalysis.
+    The pipeline stops at the first stage that is not a "success", e.g. "failed" or "collapsed".
+    Return a list of the results of the stages that are run, None for the stages that are not
+    analyses or are finished before the resume.
+    '''
+    ud=dict(ud) if ud is not None else {}
+    checkpointDir=ud.get('checkpointDir', defaultControl('Static', 1.0)['checkpointDir'])
+    directory=os.path.join(checkpointDir, 'pipeline')
+    shared={}
+    first=0
+    if resume:
+        first=loadPipelineCheckpoint(directory, shared)
+    
+    results=[None]*first
+    for i in range(first, len(stages)):
+        stage=dict(stages[i])
+        kind=stage.pop('type')
+        control=dict(ud, **stage.pop('ud', {}))
+        control['checkpointDir']=os.path.join(checkpointDir, 'stage%d' %(i))
+        logger.info(">>> SmartAnalyze: Pipeline stage %i: %s", i, kind)
+        if kind=='loadConst':
+            if 'time' in stage:
+                ops.loadConst('-time', stage['time'])
+            else:
+                ops.loadConst()
+            result=None
+        elif kind=='call':
+            stage['function']()
+            # the function may change the analyze commands.
+            shared.pop('config', None)
+            result=None
+        else:
+            drivers={'loadControl': SmartAnalyzeLoadControl, 'static': SmartAnalyzeStatic,
+                     'arcLength': SmartAnalyzeArcLength, 'transient': SmartAnalyzeTransient}
+            if kind not in drivers:
+                raise ValueError("SmartAnalyze: Unknown pipeline stage %r." %(kind,))
+            result=drivers[kind](ud=control, resume=(resume and i==first), shared=shared, **stage)
+        results.append(result)
+        if result is not None and result.ok<0:
+            logger.warning(">>> SmartAnalyze: Pipeline stopped at stage %i (%s).", i, result.status)
+            return results
+        if ud.get('pipelineCheckpoint'):
+            savePipelineCheckpoint(directory, i+1, shared)
+    return results
+
+
+def loadHandoff(control, current, shared):
+    '''
+    Use the counters and the step controller state of the last stages of SmartAnalyzePipeline.
+    The counters are shared, so they add up from stage to stage.
+    '''
+    current['shared']=shared
+    for key in handoffKeys:
+        if key in shared:
+            current[key]=shared[key]
+    current['pipelineWallTime']=shared.get('wallTime', 0.0)
+    controller=shared.get('stepControllers', {}).get((control['analysis'], control['integrator']))
+    if controller is not None:
+        current['adaptStep'], current['lastIter']=controller
+
+
+def saveHandoff(wallTime, control, current):
+    '''
+    wallTime: the wall time from the start of the pipeline
+    Save the counters and the step controller state for the next stages of SmartAnalyzePipeline.
+    The step controller is kept for each analysis and integrator, as their step lengths differ.
+    The analyze commands that are set at the end are saved for setupAnalysis.
+    '''
+    shared=current['shared']
+    for key in handoffKeys:
+        shared[key]=current[key]
+    shared['wallTime']=wallTime
+    integrator=None
+    if control['analysis']=='Static':
+        integrator=integratorArgs(current['integrator'], current['step'], current['node'], current['dof'], control)
+    shared['config']={'test': (current['testType'], current['testTol'], current['testIterTimes'], control['testPrintFlag']),
+                      'algoType': current['algoType'], 'integrator': integrator, 'analysis': control['analysis']}
+    controllers=shared.setdefault('stepControllers', {})
+    controllers[(control['analysis'], control['integrator'])]=(current['adaptStep'], current['lastIter'])
+
+
+# the status shared by the stages of a pipeline
+handoffKeys=['analyzeCalls', 'strategyCalls', 'strategyTime', 'minStepReached', 'perf', 'algoStats', 'algoStatsSaved']
+
+
+def savePipelineCheckpoint(directory, stage, shared):
+    '''
+    Save the domain and the shared state before the stage of a pipeline to directory.
+    Two commit tags are used in turn, like saveCheckpoint.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    # the stages may have used the database for their own checkpoints.
+    ops.database('File', os.path.join(directory, 'domain'))
+    commitTag=shared.get('commitTag', 2)%2+1
+    ops.save(commitTag)
+    shared['commitTag']=commitTag
+    path=os.path.join(directory, 'pipeline.pkl')
+    with open(path+'.tmp', 'wb') as f:
+        pickle.dump({'stage': stage, 'shared': shared}, f)
+    os.replace(path+'.tmp', path)
+    logger.info(">>> SmartAnalyze: Pipeline checkpoint saved before stage %i.", stage)
+
+
+def loadPipelineCheckpoint(directory, shared):
+    '''
+    Restore the domain and the shared state from the checkpoint of a pipeline.
+    The model must be built in the same way as the pipeline that saved the checkpoint.
+    Return the stage to start with, 0 if there is no checkpoint.
+    '''
+    path=os.path.join(directory, 'pipeline.pkl')
+    if not os.path.exists(path):
+        logger.info(">>> SmartAnalyze: No pipeline checkpoint found in %s. Start from the first stage.", directory)
+        return 0
+    with open(path, 'rb') as f:
+        state=pickle.load(f)
+    shared.update(state['shared'])
+    # the analyze commands are not in the database.
+    shared.pop('config', None)
+    ops.database('File', os.path.join(directory, 'domain'))
+    ops.restore(shared['commitTag'])
+    logger.info(">>> SmartAnalyze: Resume the pipeline from stage %i.", state['stage'])
+    return state['stage']
+
+
+def SmartAnalyzeBatch(buildModel, jobs, ud=None, maxWorkers=None):
+    '''
+    buildModel: a function buildModel(record, scale) that builds the model with the
+        ground motion `record` scaled by `scale`, and returns (dt, npts).
+        It may return (dt, npts, accel) to cut the record by `significantDuration`,
+        or (dt, npts, accel, accelDt) if the time step of the record is not dt.
+        It must be defined at module level so that it can be sent to the workers.
+    jobs: a list of (record, scale)
+    ud: change the control parameters in control dict
+    maxWorkers: the number of worker processes. Default is the number of cores.
+    Each job runs SmartAnalyzeTransient in a worker process with its own OpenSees domain.
+    Return a list of dicts with the results of each job, in the order of jobs.
+    '''
+    results=[None]*len(jobs)
+    # the messages of the workers are written by this process.
+    logQueue=multiprocessing.Queue()
+    listener=logging.handlers.QueueListener(logQueue, *logger.handlers)
+    listener.start()
+    pool=BatchPool(buildModel, maxWorkers, (logger.getEffectiveLevel(), False, logQueue))
+    try:
+        for i, (record, scale) in enumerate(jobs):
+            pool.submit(i, record, scale, jobControl(ud, 'job%d' %(i)))
+        for i, result in pool.results():
+            results[i]=result
+    finally:
+        pool.shutdown()
+        listener.stop()
+    return results
+
+
+class BatchPool:
+    '''
+    A process pool of runBatchJob that holds no more jobs than workers.
+    A crashed worker breaks all jobs in a process pool, so when it happens, only the jobs that
+    were running are run again, each in its own process, and the others go on in a new pool.
+    '''
+    
+    def __init__(self, buildModel, maxWorkers, initargs):
+        self.buildModel=buildModel
+        self.maxWorkers=maxWorkers or os.cpu_count() or 1
+        self.initargs=initargs
+        self.waiting=[]
+        self.running={}
+        self.executor=self.newExecutor()
+    
+    def newExecutor(self):
+        return ProcessPoolExecutor(max_workers=self.maxWorkers, initializer=setLogging, initargs=self.initargs)
+    
+    def submit(self, key, record, scale, control):
+        '''
+        Add a job with its control parameters, see jobControl. It can be called while the results are read.
+        '''
+        self.waiting.append((key, record, scale, control))
+    
+    def results(self):
+        '''
+        Yield (key, result) of the jobs as they are finished, until no job is left.
+        '''
+        while self.waiting or self.running:
+            while self.waiting and len(self.running)<self.maxWorkers:
+                key, record, scale, control=job=self.waiting.pop(0)
+                future=self.executor.submit(runBatchJob, self.buildModel, record, scale, control)
+                self.running[future]=job
+            done=wait(list(self.running), return_when=FIRST_COMPLETED).done
+            if not any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                for future in done:
+                    yield self.running.pop(future)[0], future.result()
+                continue
+            
+            # the pool is broken. The jobs that were finished before are kept.
+            self.executor.shutdown()
+            crashed=[]
+            for future, job in self.running.items():
+                if future.exception() is None:
+                    yield job[0], future.result()
+                else:
+                    crashed.append(job)
+            self.running.clear()
+            self.executor=self.newExecutor()
+            for job, result in zip(crashed, runCrashedJobs(self.buildModel, crashed, self.initargs)):
+                yield job[0], result
+    
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def runCrashedJobs(buildModel, jobs, initargs):
+    '''
+    jobs: a list of (key, record, scale, control)
+    Run the jobs of a broken process pool again, each in its own process at the same time.
+    Return the results in the order of jobs, with the status "crashed" for those that crash again.
+    '''
+    executors=[ProcessPoolExecutor(max_workers=1, initializer=setLogging, initargs=initargs) for job in jobs]
+    futures=[executor.submit(runBatchJob, buildModel, record, scale, control)
+             for executor, (key, record, scale, control) in zip(executors, jobs)]
+    results=[]
+    for future, (key, record, scale, control) in zip(futures, jobs):
+        try:
+            results.append(future.result())
+        except BrokenProcessPool as e:
+            results.append({'record': record, 'scale': scale, 'status': 'crashed', 'ok': None,
+                            'wallTime': 0.0, 'analyzeCalls': 0, 'segments': 0, 'progress': 0.0, 'error': repr(e)})
+    for executor in executors:
+        executor.shutdown()
+    return results
+
+
+def jobControl(ud, name):
+    '''
+    Return the control parameters of the job `name` of SmartAnalyzeBatch or SmartAnalyzeIDA.
+    The workers run at the same time, so each job has its own `checkpointDir`, e.g. "SmartAnalyzeCheckpoint/job0",
+    and its own `journalFile` and `replayFile`, e.g. "journal_job0.json". `warmStartFile` is only read,
+    so it is kept as it is. SmartAnalyzeIDA sets it to the journal of the last scale.
+    '''
+    control=dict(ud) if ud is not None else {}
+    control['checkpointDir']=os.path.join(control.get('checkpointDir', defaultControl('Transient', 1.0)['checkpointDir']), name)
+    for key in ('journalFile', 'replayFile'):
+        if control.get(key):
+            control[key]=jobFile(control[key], name)
+    return control
+
+
+def jobFile(path, name):
+    '''
+    Return the file of the job `name`, e.g. "journal_job0.json" for "journal.json".
+    '''
+    root, ext=os.path.splitext(path)
+    return "%s_%s%s" %(root, name, ext)
+
+
+def runBatchJob(buildModel, record, scale, ud):
+    '''
+    Run one job of SmartAnalyzeBatch in the worker process.
+    '''
+    result={'record': record, 'scale': scale, 'status': 'error', 'ok': None,
+            'wallTime': 0.0, 'analyzeCalls': 0, 'segments': 0, 'progress': 0.0, 'error': None}
+    startTime=time.time()
+    try:
+        ops.wipe()
+        model=buildModel(record, scale)
+        dt, npts=model[:2]
+        accel=model[2] if len(model)>2 else None
+        accelDt=model[3] if len(model)>3 else None
+        analysis=SmartAnalyzeTransient(dt, npts, ud, accel=accel, accelDt=accelDt)
+    except Exception as e:
+        result['wallTime']=time.time()-startTime
+        result['error']=repr(e)
+        return result
+    
+    result.update(analysis.asDict())
+    return result
+
+
+def SmartAnalyzeIDA(buildModel, records, ud=None, maxWorkers=None, firstScale=0.1, huntFactor=2.0,
+                    maxRuns=12, resolution=0.05):
+    '''
+    buildModel: a function buildModel(record, scale) as in SmartAnalyzeBatch.
+    records: a list of records
+    ud: change the control parameters in control dict
+    maxWorkers: the number of worker processes. Default is the number of cores.
+    firstScale: the first scale of each record
+    huntFactor: the factor by which the scale grows in the hunt
+    maxRuns: the maximum number of runs of each record
+    resolution: the bisection stops when the gap between the last stable and the first unstable
+        scale is smaller than it times the unstable scale.
+    Run an incremental dynamic analysis of each record by hunt and fill, see IDAHunt.
+    A run is stable if its status is "success". Set `stopConditions` in ud, so that
+    the runs above the capacity stop as "collapsed" at the collapse limit instead of running to the end.
+    If `journalFile` is set in ud, each run starts with the journal of the nearest finished lower scale
+    of its record as `warmStartFile`.
+    Return a list of dicts in the order of records, with the keys
+        record, capacity (the last stable scale, None if none is), collapse (the first unstable scale,
+        None if none is), and runs (the results of SmartAnalyzeBatch, sorted by scale).
+    '''
+    hunts=[IDAHunt(firstScale, huntFactor, maxRuns, resolution) for record in records]
+    logQueue=multiprocessing.Queue()
+    listener=logging.handlers.QueueListener(logQueue, *logger.handlers)
+    listener.start()
+    pool=BatchPool(buildModel, maxWorkers, (logger.getEffectiveLevel(), False, logQueue))
+    
+    def jobName(i, scale):
+        return 'record%d_scale%g' %(i, scale)
+    
+    def submit(i):
+        for scale in hunts[i].nextScales():
+            hunts[i].running.add(scale)
+            control=jobControl(ud, jobName(i, scale))
+            # start from the journal of the nearest finished lower scale of the record.
+            lower=[done for done in hunts[i].results if done<scale]
+            if control.get('journalFile') and lower:
+                control['warmStartFile']=jobFile(ud['journalFile'], jobName(i, max(lower)))
+            pool.submit((i, scale), records[i], scale, control)
+
+    
+    try:
+        for i in range(len(records)):
+            submit(i)
+        for (i, scale), result in pool.results():
+            hunts[i].add(scale, result)
+            submit(i)
+    finally:
+        pool.shutdown()
+        listener.stop()
+    
+    curves=[]
+    for record, hunt in zip(records, hunts):
+        capacity, collapse=hunt.bracket()
+        curves.append({'record': record, 'capacity': capacity, 'collapse': collapse,
+                       'runs': [hunt.results[scale] for scale in sorted(hunt.results)]})
+    return curves
+
+
+class IDAHunt:
+    '''
+    The scales of one record in SmartAnalyzeIDA, chosen by hunt and fill:
+    1. Hunt: the scale grows from firstScale by huntFactor until a run is unstable.
+    2. Bracket: bisect between the last stable and the first unstable scale, down to `resolution`.
+    3. Fill: the rest of the runs are put in the middle of the largest gaps between the stable scales.
+    The hunt and the bracket run one scale at a time. The fill runs all its scales at once.
+    '''
+    def __init__(self, firstScale, huntFactor, maxRuns, resolution):
+        self.firstScale=firstScale
+        self.huntFactor=huntFactor
+        self.maxRuns=maxRuns
+        self.resolution=resolution
+        self.results={}
+        self.running=set()
+    
+    def add(self, scale, result):
+        self.running.discard(scale)
+        self.results[scale]=result
+    
+    def bracket(self):
+        '''
+        Return the last stable scale below the first unstable scale, and the first unstable scale.
+        Either is None if there is none.
+        '''
+        unstable=[scale for scale, result in self.results.items() if not isStableRun(result)]
+        collapse=min(unstable) if unstable else None
+        stable=[scale for scale, result in self.results.items()
+                if isStableRun(result) and (collapse is None or scale<collapse)]
+        return (max(stable) if stable else None), collapse
+    
+    def nextScales(self):
+        '''
+        Return the scales to run next. It is empty if the record waits for its running scales or is done.
+        '''
+        budget=self.maxRuns-len(self.results)-len(self.running)
+        if budget<=0:
+            return []
+        capacity, collapse=self.bracket()
+        if collapse is None or collapse-(capacity or 0.0)>self.resolution*collapse:
+            # the hunt and the bracket go one scale at a time.
+            if self.running:
+                return []
+            if collapse is None:
+                return [max(self.results, default=self.firstScale/self.huntFactor)*self.huntFactor]
+            return [((capacity or 0.0)+collapse)/2]
+        
+        scales=sorted(scale for scale in list(self.results)+list(self.running) if scale<=capacity)
+        fill=[]
+        for n in range(budget):
+            points=[0.0]+sorted(scales+fill)
+            gaps=[(points[j+1]-points[j], j) for j in range(len(points)-1)]
+            gap, j=max(gaps)
+            if gap<=self.resolution*capacity:
+                break
+            fill.append((points[j]+points[j+1])/2)
+        return fill
+
+
+def isStableRun(result):
+    '''
+    Return True if a run of SmartAnalyzeIDA is stable.
+    A run that is "collapsed", "failed", "timeout", "error" or "crashed" is not.
+    '''
+    return result['status']=='success'
+
+
+def SmartAnalyzeForked(prepare, jobs, runJob, maxWorkers=None, timeout=None):
+    '''
+    prepare: a function prepare() that builds the model and runs the gravity analysis.
+        It is called once in this process. Pass None if the model is already built.
+    jobs: a list of jobs. Each job is passed to runJob.
+    runJob: a function runJob(job) that applies the job to the prepared model,
+        e.g. adds the ground motion and calls SmartAnalyzeTransient. Its return value must be picklable.
+    maxWorkers: the number of jobs running at the same time. Default is the number of cores.
+    timeout: the maximum wall time in seconds of a job. Default is None (no limit).
+    Each job runs in a process forked from the prepared state,
+    so the model is not built again and the memory pages are shared.
+    Only available on systems that support os.fork().
+    Return a list of dicts with the results of each job, in the order of jobs.
+    '''
+    if not hasattr(os, 'fork'):
+        raise OSError("SmartAnalyzeForked requires os.fork(), which is not available on this system.")
+    if prepare is not None:
+        prepare()
+    if maxWorkers is None:
+        maxWorkers=os.cpu_count() or 1
+    
+    results=[None]*len(jobs)
+    waiting=list(range(len(jobs)))
+    running={}
+    selector=selectors.DefaultSelector()
+    while waiting or running:
+        # start new jobs
+        while waiting and len(running)<maxWorkers:
+            i=waiting.pop(0)
+            pid, fd=forkCall(runJob, jobs[i])
+            running[fd]={'index': i, 'pid': pid, 'startTime': time.time(), 'data': []}
+            selector.register(fd, selectors.EVENT_READ)
+        
+        # collect the outputs of the running jobs
+        for key, event in selector.select(timeout=1.0):
+            fd=key.fd
+            data=os.read(fd, 65536)
+            if data:
+                running[fd]['data'].append(data)
+                continue
+            job=running.pop(fd)
+            selector.unregister(fd)
+            os.close(fd)
+            os.waitpid(job['pid'], 0)
+            results[job['index']]=forkResult(jobs[job['index']], job, b''.join(job['data']))
+        
+        # kill the jobs that exceed the time limit
+        if timeout is not None:
+            for fd, job in list(running.items()):
+                if time.time()-job['startTime']>timeout:
+                    os.kill(job['pid'], signal.SIGKILL)
+                    os.waitpid(job['pid'], 0)
+                    selector.unregister(fd)
+                    os.close(fd)
+                    del running[fd]
+                    results[job['index']]={'job': jobs[job['index']], 'status': 'timeout', 'result': None,
+                                           'wallTime': time.time()-job['startTime'], 'error': None}
+    selector.close()
+    return results
+
+
+def forkCall(func, *args):
+    '''
+    Fork a child process that calls func(*args), sends the pickled
+    ('ok', returnValue) or ('error', message) through a pipe, and exits.
+    Return the pid of the child and the file descriptor to read from.
+    '''
+    sys.stdout.flush()
+    sys.stderr.flush()
+    readFd, writeFd=os.pipe()
+    pid=os.fork()
+    if pid!=0:
+        os.close(writeFd)
+        return pid, readFd
+    
+    # in the child process
+    os.close(readFd)
+    # the thread of a queued log handler is not copied to the child.
+    global logListener
+    if logListener is not None:
+        logListener=None
+        setLogging(logger.level)
+    try:
+        try:
+            output=('ok', func(*args))
+        except Exception as e:
+            output=('error', repr(e))
+        try:
+            data=pickle.dumps(output)
+        except Exception as e:
+            # e.g. a lambda is returned.
+            data=pickle.dumps(('error', repr(e)))
+        with os.fdopen(writeFd, 'wb') as f:
+            f.write(data)
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(0)
+
+
+def forkResult(job, child, data):
+    '''
+    Convert the output of a forked job to a result dict.
+    '''
+    result={'job': job, 'status': 'crashed', 'result': None,
+            'wallTime': time.time()-child['startTime'], 'error': None}
+    if not data:
+        return result
+    kind, value=pickle.loads(data)
+    if kind=='ok':
+        result['status']='success'
+        result['result']=value
+    else:
+        result['status']='error'
+        result['error']=value
+    return result
+
+
+def checkpointEnabled(control):
+    '''
+    Return True if checkpoints are saved.
+    A checkpoint is also saved when the analysis fails or exceeds the time limit,
+    so a new run can retry from the last converged state.
+    '''
+    return control['checkpointPer']>0 or control['checkpointInterval']>0
+
+
+def needCheckpoint(control, current):
+    '''
+    Return True if a checkpoint is due according to checkpointPer and checkpointInterval.
+    '''
+    if not checkpointEnabled(control):
+        return False
+    if 'checkpointProgress' not in current:
+        current['checkpointProgress']=current['progress']
+        current['checkpointTime']=time.time()
+    if control['checkpointPer']>0 and current['progress']-current['checkpointProgress']>=control['checkpointPer']:
+        return True
+    if control['checkpointInterval']>0 and time.time()-current['checkpointTime']>=control['checkpointInterval']:
+        return True
+    return False
+
+
+def saveCheckpoint(control, current):
+    '''
+    Save the domain with the OpenSees database command,
+    and the current status to checkpoint.json in control['checkpointDir'].
+    Two commit tags are used in turn, so the last checkpoint is kept
+    if the process is stopped during saving.
+    After a failure, current['partial'] is the length of the failed segment that is committed,
+    so only the rest of it is analyzed on resume.
+    '''
+    directory=control['checkpointDir']
+    if not current.get('database'):
+        os.makedirs(directory, exist_ok=True)
+        ops.database('File', os.path.join(directory, 'domain'))
+        current['database']=True
+    commitTag=current.get('commitTag', 2)%2+1
+    ops.save(commitTag)
+    current['commitTag']=commitTag
+    
+    state={key: current[key] for key in checkpointKeys if key in current}
+    state['analysis']=control['analysis']
+    path=os.path.join(directory, 'checkpoint.json')
+    with open(path+'.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path+'.tmp', path)
+    
+    current['checkpointProgress']=current['progress']
+    current['checkpointTime']=time.time()
+    if control['debugMode']:
+        logger.info("*** SmartAnalyze: checkpoint saved at progress %f", progressFraction(current))
+
+
+def loadCheckpoint(control, current):
+    '''
+    Restore the domain and the current status from the last checkpoint.
+    The model must be built in the same way as the analysis that saved the checkpoint.
+    Return True if a checkpoint is loaded.
+    '''
+    directory=control['checkpointDir']
+    path=os.path.join(directory, 'checkpoint.json')
+    if not os.path.exists(path):
+        logger.info(">>> SmartAnalyze: No checkpoint found in %s. Start from the beginning.", directory)
+        return False
+    with open(path) as f:
+        state=json.load(f)
+    if state['analysis']!=control['analysis'] or state['segs']!=current['segs']:
+        raise ValueError("SmartAnalyze: The checkpoint in %s does not match this analysis." %(directory))
+    
+    ops.database('File', os.path.join(directory, 'domain'))
+    ops.restore(state['commitTag'])
+    current['database']=True
+    current.update(state)
+    del current['analysis']
+    
+    # set the analyze commands as they were.
+    useAlgorithm(current['algoType'], current)
+    useTest(current['testIterTimes'], current['testTol'], control, current)
+    if control['analysis']=='Static':
+        current['integrator']=None
+        useIntegrator(current['step'], control, current)
+    logger.info(">>> SmartAnalyze: Resume from progress %f.", progressFraction(current))
+    return True
+
+
+# the status saved in a checkpoint
+checkpointKeys=['progress', 'partial', 'segs', 'step', 'algoIndex', 'algoType', 'testType', 'testIterTimes', 'testTol',
+                'adaptStep', 'lastIter', 'analyzeCalls', 'commitTag', 'journal', 'distance']
+
+
+def recordJournal(step, steps, current):
+    '''
+    step: the step length
+    steps: the number of converged steps
+    Add converged steps to the journal. Runs of steps with the same length,
+    algorithm and test are kept as one entry:
+    [start time, step, number of steps, algoType, testType, testIterTimes, testTol]
+    '''
+    journal=current['journal']
+    settings=[current['algoType'], current['testType'], current['testIterTimes'], current['testTol']]
+    if journal and journal[-1][1]==step and journal[-1][3:]==settings:
+        journal[-1][2]+=steps
+        return
+    journal.append([ops.getTime()-step*steps, step, steps]+settings)
+
+
+def saveJournal(path, ok, control, current):
+    '''
+    Save the journal of the converged steps to a json file.
+    '''
+    journal={'analysis': control['analysis'], 'segs': current['segs'], 'progress': current['progress'],
+             'ok': ok, 'steps': current['journal']}
+    with open(path+'.tmp', 'w') as f:
+        json.dump(journal, f)
+    os.replace(path+'.tmp', path)
+
+
+def replayJournal(path, control, current):
+    '''
+    Analyze along the converged steps in the journal at path, saved by an analysis
+    of the same model with `journalFile`. No step is tried twice.
+    Return the ok code of the analysis that saved the journal,
+    or -1 if a step does not converge, i.e. the model is not the same.
+    '''
+    with open(path) as f:
+        journal=json.load(f)
+    if journal['analysis']!=control['analysis'] or journal['segs']!=current['segs']:
+        raise ValueError("SmartAnalyze: The journal %s does not match this analysis." %(path))
+    
+    pbar=tqdm(total=len(journal['steps']), desc="SmartAnalysisReplay", position=0)
+    for startTime, step, steps, algoType, testType, testIterTimes, testTol in journal['steps']:
+        if algoType!=current['algoType']:
+            useAlgorithm(algoType, current)
+        if testType!=current['testType'] or testIterTimes!=current['testIterTimes'] or testTol!=current['testTol']:
+            useTest(testIterTimes, testTol, control, current, testType)
+        start=time.perf_counter()
+        ok=ops.analyze(steps, step)
+        elapsed=time.perf_counter()-start
+        countAnalyze(ok, step, steps if ok==0 else 0, elapsed, current)
+        addStrategyCost('replay', 1, elapsed, current)
+        pbar.update()
+        if ok<0:
+            pbar.close()
+            logger.warning(">>> SmartAnalyze: Replay failed at time %f. The journal %s does not fit this model.", ops.getTime(), path)
+            return -1
+    pbar.close()
+    current['progress']=journal['progress']
+    return journal['ok']
+
+
+def loadDifficultyMap(path, control):
+    '''
+    Load the hard windows of time from a journal saved by `journalFile`, i.e. the runs of steps
+    shorter than `initialStep` or with another algorithm than the first one of `algoTypes`.
+    Return a list of [start time, end time, step, algoIndex], or an empty list if the file does not exist.
+    '''
+    if not os.path.exists(path):
+        logger.info(">>> SmartAnalyze: No journal found in %s. Start without the warm start.", path)
+        return []
+    with open(path) as f:
+        journal=json.load(f)
+    hard=[]
+    for startTime, step, steps, algoType, testType, testIterTimes, testTol in journal['steps']:
+        algoIndex=control['algoTypes'].index(algoType) if algoType in control['algoTypes'] else 0
+        if abs(step)<abs(control['initialStep'])*(1-1e-9) or algoIndex!=0:
+            hard.append([startTime, startTime+step*steps, abs(step), algoIndex])
+    return hard
+
+
+def hardWindows(step, current):
+    '''
+    Drop the hard windows of the warm start that end before the current time,
+    and return the rest. A window is passed if it ends within a tiny fraction of step.
+    '''
+    now=ops.getTime()+abs(step)*1.0e-6
+    warmMap=current['warmMap']
+    while warmMap and warmMap[0][1]<=now:
+        warmMap.pop(0)
+    return warmMap
+
+
+def warmFreeSteps(step, current):
+    '''
+    Return the number of whole steps before the next hard window of the warm start.
+    '''
+    warmMap=hardWindows(step, current)
+    if not warmMap:
+        return math.inf
+    return max(int(math.floor((warmMap[0][0]-ops.getTime())/abs(step)+1.0e-6)), 0)
+
+
+def warmStartItems(step, testIterTimes, testTol, control, current):
+    '''
+    step: the whole length of the segment to be analyzed.
+    Return the work items that analyze the segment with the shortest step length and the algorithm
+    of the hard windows of the warm start it overlaps, or None if it overlaps none.
+    '''
+    warmMap=hardWindows(step, current)
+    end=ops.getTime()+abs(step)*(1-1.0e-6)
+    windows=[]
+    for window in warmMap:
+        if window[0]>=end:
+            break
+        windows.append(window)
+    if not windows:
+        return None
+    subStep=min(window[2] for window in windows)
+    n=max(int(math.ceil(abs(step)/subStep-1.0e-6)), 1)
+    return [['trial', step/n, windows[0][3], testIterTimes, testTol, 'warmStart'] for i in range(n)]
+
+
+def marchSegment(step, testIterTimes, testTol, vcontrol, vcurrent):
+    '''
+    step: the whole length of the segment to be analyzed.
+    testIterTimes: Maximum nunmber of tests.
+    testTol: test tolarence.
+    vcontrol: control variables
+    vcurrent: current control variables
+    If stepControl is "adaptive", the segment is marched with the step length
+    carried by the step controller. Otherwise it is analyzed at full length.
+    '''
+    return analyzeStack([segmentItem(step, testIterTimes, testTol, vcontrol, 'initial')], vcontrol, vcurrent)
+
+
+def segmentItem(step, testIterTimes, testTol, control, strategy):
+    '''
+    Return the work item that analyzes a whole segment.
+    The steps of the arc length integrators are not divided.
+    '''
+    if control['stepControl']=='adaptive' and control['integrator'] not in arcIntegrators:
+        return ['march', step, testIterTimes, testTol, strategy]
+    return ['trial', step, None, testIterTimes, testTol, strategy]
+
+
+def batchAnalyze(k, control, current):
+    '''
+    k: number of steps in the block
+    Analyze k transient steps of initialStep in one ops.analyze call,
+    using the algorithm chosen by the `algoPolicy` and the initial test.
+    Return the ok code and the number of steps that are committed.
+    If the block fails, OpenSees reverts the domain to the last converged step,
+    so the committed steps are counted from the domain time.
+    '''
+    step=control['initialStep']
+    algoIndex=startAlgoIndex(control, current)
+    if current['algoIndex']!=algoIndex:
+        useAlgorithm(control['algoTypes'][algoIndex], current)
+        current['algoIndex']=algoIndex
+    if (current['testIterTimes']!=control['testIterTimes'] or current['testTol']!=control['testTol']
+            or current['testType']!=control['testType']):
+        useTest(control['testIterTimes'], control['testTol'], control, current, control['testType'])
+    
+    startTime=ops.getTime()
+    start=time.perf_counter()
+    ok=ops.analyze(k, step)
+    elapsed=time.perf_counter()-start
+    done=k if ok==0 else int(round((ops.getTime()-startTime)/step))
+    countAnalyze(ok, step, done, elapsed, current)
+    addStrategyCost('batch', 1, elapsed, current)
+    return ok, done
+
+
+def updateStepController(control, current):
+    '''
+    PI step controller. Called after a converged trial.
+    The step length is grown if less iterations than targetIterTimes are used,
+    and shrunk otherwise. It is never larger than the segment length,
+    and never smaller than minStep, which is also the limit of DivideStage.
+    '''
+    iters=max(ops.testIter(), 1)
+    factor=(control['targetIterTimes']/iters)**control['stepControlKI']*(current['lastIter']/iters)**control['stepControlKP']
+    factor=min(max(factor, control['shrinkFactor']), control['growFactor'])
+    current['adaptStep']=min(max(current['adaptStep']*factor, control['minStep']), current['maxStep'])
+    current['lastIter']=iters
+
+
+def trialAnalyze(step, control, current, integrator=None):
+    '''
+    step: the step length
+    integrator: the static integrator. Default is control['integrator'].
+    Set the step length and analyze once. Return the ok code.
+    '''
+    # change step length
+    if control['analysis']=='Static':
+        useIntegrator(step, control, current, integrator)
+    
+    # trial analyze once
+    start=time.perf_counter()
+    if control['analysis']=='Static':
+        loadFactor=ops.getTime()
+        ok=ops.analyze(1)
+        if ok==0:
+            # the direction of the load, for the switch to arc length.
+            current['loadStep']=ops.getTime()-loadFactor
+    else:
+        ok=ops.analyze(1, step)
+    countAnalyze(ok, step, 1 if ok==0 else 0, time.perf_counter()-start, current)
+    # the length of the segment that is committed. The switch to arc length counts it by itself.
+    if ok==0 and integrator is None:
+        current['segmentDone']=current.get('segmentDone', 0.0)+step
+    return ok
+
+
+def countAnalyze(ok, step, steps, elapsed, current):
+    '''
+    ok: the ok code of ops.analyze
+    step: the step length
+    steps: the number of converged steps
+    elapsed: the time spent in ops.analyze
+    Count an ops.analyze call in the status and the performance counters.
+    '''
+    current['counter']+=1
+    current['analyzeCalls']+=1
+    current['minStepReached']=min(current['minStepReached'], abs(step))
+    perf=current['perf']
+    perf['analyzeTime']+=elapsed
+    perf['newtonIters']+=ops.testIter()
+    calls=perf['callsOk'] if ok==0 else perf['callsFailed']
+    calls[current['algoType']]=calls.get(current['algoType'], 0)+1
+    # [tries, successes, time, iterations] of the algorithm, for `algoOrder`
+    stats=current['algoStats'].setdefault(current['algoType'], [0, 0, 0.0, 0])
+    stats[0]+=1
+    stats[2]+=elapsed
+    if ok==0:
+        stats[1]+=1
+        stats[3]+=ops.testIter()
+    if steps>0 and current.get('journal') is not None:
+        recordJournal(step, steps, current)
+    if steps>0:
+        # the buckets are powers of 2. A step is counted in the smallest bucket not less than it.
+        mantissa, exponent=math.frexp(abs(step))
+        # a power of 2 is its own bucket.
+        bucket=2.0**(exponent-1 if mantissa==0.5 else exponent)
+        perf['stepHistogram'][bucket]=perf['stepHistogram'].get(bucket, 0)+steps
+
+
+def useAlgorithm(algoType, current):
+    '''
+    Set the algorithm and count the time of reconfiguration.
+    '''
+    start=time.perf_counter()
+    setAlgorithm(algoType)
+    current['algoType']=algoType
+    current['perf']['configTime']+=time.perf_counter()-start
+
+
+def useIntegrator(step, control, current, integrator=None):
+    '''
+    Set the static integrator and the step length if they change,
+    and count the time of reconfiguration. The arc length integrators are set once.
+    integrator: the static integrator. Default is control['integrator'].
+    '''
+    integrator=integrator or control['integrator']
+    # the arc length is constant. A new ArcLength integrator would lose the direction of the path.
+    if current['integrator']==integrator and (current['step']==step or integrator in arcIntegrators):
+        return
+    start=time.perf_counter()
+    ops.integrator(*integratorArgs(integrator, step, current['node'], current['dof'], control))
+    current['perf']['configTime']+=time.perf_counter()-start
+    current['integrator']=integrator
+    current['step']=step
+
+
+# the integrators with a constant arc length
+arcIntegrators=('ArcLength', 'MinUnbalDispNorm')
+
+
+def useTest(testIterTimes, testTol, control, current, testType=None):
+    '''
+    Set the test and count the time of reconfiguration.
+    testType: the test type. Default is the current one.
+    '''
+    testType=testType or current['testType']
+    start=time.perf_counter()
+    ops.test(testType, testTol, testIterTimes, control['testPrintFlag'])
+    current['testType']=testType
+    current['testIterTimes']=testIterTimes
+    current['testTol']=testTol
+    current['perf']['configTime']+=time.perf_counter()-start
+
+
+def addStrategyCost(strategy, calls, elapsed, current):
+    '''
+    Count the ops.analyze calls and the wall time of a way to converge.
+    '''
+    if calls:
+        current['strategyCalls'][strategy]=current['strategyCalls'].get(strategy, 0)+calls
+    current['strategyTime'][strategy]=current['strategyTime'].get(strategy, 0.0)+elapsed
+
+
+def newPerf():
+    '''
+    Return the empty performance counters.
+    analyzeTime: the time spent in ops.analyze
+    configTime: the time spent in ops.test, ops.algorithm and ops.integrator
+    newtonIters: the total number of iterations, from ops.testIter()
+        (for a batch, only the iterations of its last step are counted)
+    callsOk, callsFailed: the number of converged and failed ops.analyze calls of each algorithm type
+    stepHistogram: the number of converged steps in each bucket of step length
+    '''
+    return {'analyzeTime': 0.0, 'configTime': 0.0, 'newtonIters': 0,
+            'callsOk': {}, 'callsFailed': {}, 'stepHistogram': {}}
+
+
+def raceAnalyze(step, control, current):
+    '''
+    step: the step length that failed
+    Try the strategies in `raceStrategies` at the same time, each in a process forked
+    from the last converged state. The first strategy that converges is analyzed again
+    in this process.
+    Return the rest of the step to be analyzed, or None if no strategy converges.
+    '''
+    strategies=control['raceStrategies']
+    if strategies is None:
+        # the current algorithm at the full step has just failed.
+        strategies=[(algoType, 1.0) for i, algoType in enumerate(control['algoTypes']) if i!=current['algoIndex']]
+        strategies.append((control['algoTypes'][0], control['relaxation']))
+    if control['analysis']=='Static' and control['integrator'] in arcIntegrators:
+        # the arc length is not divided.
+        strategies=[(algoType, factor) for algoType, factor in strategies if factor==1.0]
+    strategies=strategies[:control['raceWorkers'] or os.cpu_count() or 1]
+    
+    selector=selectors.DefaultSelector()
+    children={}
+    for algoType, factor in strategies:
+        pid, fd=forkCall(raceTrial, algoType, step*factor, control, current)
+        children[fd]={'pid': pid, 'strategy': (algoType, factor), 'data': []}
+        selector.register(fd, selectors.EVENT_READ)
+    
+    winner=None
+    while children and winner is None:
+        for key, event in selector.select():
+            fd=key.fd
+            data=os.read(fd, 4096)
+            if data:
+                children[fd]['data'].append(data)
+                continue
+            child=children.pop(fd)
+            selector.unregister(fd)
+            os.close(fd)
+            os.waitpid(child['pid'], 0)
+            # a child that crashes, e.g. in ops.analyze, writes nothing. It loses the race.
+            try:
+                output=pickle.loads(b''.join(child['data']))
+            except Exception:
+                logger.info(">>> SmartAnalyze: Strategy %s crashed in the race.", child['strategy'])
+                continue
+            if output==('ok', 0):
+                winner=child['strategy']
+                break
+    
+    # stop the other strategies.
+    for fd, child in children.items():
+        os.kill(child['pid'], signal.SIGKILL)
+        os.waitpid(child['pid'], 0)
+        selector.unregister(fd)
+        os.close(fd)
+    selector.close()
+    
+    if winner is None:
+        logger.info(">>> SmartAnalyze: No strategy converges in the race.")
+        # the algorithms that are raced at the full step are not tried again by AlterAlgoTypesStage.
+        for algoType, factor in strategies:
+            if factor==1.0 and algoType in control['algoTypes']:
+                current['triedAlgos'].add(control['algoTypes'].index(algoType))
+        return None
+    
+    # analyze the winner in this process.
+    algoType, factor=winner
+    logger.info(">>> SmartAnalyze: Algorithm %i with step %f wins the race.", algoType, step*factor)
+    useAlgorithm(algoType, current)
+    if algoType in control['algoTypes']:
+        current['algoIndex']=control['algoTypes'].index(algoType)
+    else:
+        current['algoIndex']=-1
+    # the time is counted in the race stage.
+    ok=trialAnalyze(step*factor, control, current)
+    addStrategyCost('race', 1, 0.0, current)
+    if ok<0:
+        return None
+    if control['stepControl']=='adaptive':
+        current['adaptStep']=min(current['adaptStep'], abs(step*factor))
+        updateStepController(control, current)
+    return step-step*factor
+
+
+def raceTrial(algoType, step, control, current):
+    '''
+    Analyze once with algoType in the forked process of raceAnalyze.
+    '''
+    setAlgorithm(algoType)
+    return trialAnalyze(step, control, current)
+
+
+def startAlgoIndex(control, current):
+    '''
+    Return the index of the algorithm to start a new step with.
+    It is 0 unless `algoPolicy` is "sticky" and an algorithm is held.
+    '''
+    if control['algoPolicy']!='sticky' or current['stickyIndex']==0:
+        return 0
+    # the hold expires after stickySteps converged steps or stickyTime of (pseudo-)time.
+    scale=current['stickyScale']
+    expired=control['stickySteps']<=0 and control['stickyTime']<=0
+    if control['stickySteps']>0 and current['stickySteps']>=control['stickySteps']*scale:
+        expired=True
+    if control['stickyTime']>0 and ops.getTime()-current['stickyStart']>=control['stickyTime']*scale:
+        expired=True
+    if expired:
+        logger.info(">>> SmartAnalyze: Trying algorithm %i again.", control['algoTypes'][0])
+        current['stickyIndex']=0
+        current['stickyProbe']=True
+        return 0
+    return current['stickyIndex']
+
+
+def updateStickyAlgorithm(ok, algoIndex, control, current):
+    '''
+    Update the held algorithm of the "sticky" algoPolicy after a trial.
+    '''
+    if current['stickyProbe'] and algoIndex==0:
+        # the first algorithm is tried again after a hold.
+        # If it fails at once, the next hold is longer.
+        current['stickyProbe']=False
+        if ok==0:
+            current['stickyScale']=1.0
+        else:
+            current['stickyScale']*=control['stickyBackoff']
+    
+    if ok!=0:
+        # an algorithm that fails loses its hold.
+        if algoIndex==current['stickyIndex']:
+            current['stickyIndex']=0
+        return
+    
+    if algoIndex==0:
+        current['stickyScale']=1.0
+    elif algoIndex==current['stickyIndex']:
+        current['stickySteps']+=1
+    else:
+        current['stickyIndex']=algoIndex
+        current['stickySteps']=1
+        current['stickyStart']=ops.getTime()
+
+
+def nextAlgoIndex(algoIndex, control, current):
+    '''
+    Return the index of the next algorithm to try after algoIndex fails,
+    or None if every algorithm has been tried.
+    If `algoOrder` is "static", it is the next one in `algoTypes`.
+    If it is "ucb" or "thompson", the untried algorithm with the best score is chosen,
+    by the success rate per unit time recorded in current['algoStats'].
+    '''
+    if control['algoOrder']=='static':
+        nextIndex=algoIndex+1
+        while nextIndex in current['triedAlgos']:
+            nextIndex+=1
+        if nextIndex<len(control['algoTypes']):
+            return nextIndex
+        return None
+    
+    candidates=[i for i in range(len(control['algoTypes'])) if i not in current['triedAlgos']]
+    if not candidates:
+        return None
+    stats=current['algoStats']
+    totalTries=sum(stats[code][0] for code in stats)
+    totalTime=sum(stats[code][2] for code in stats)
+    meanTime=totalTime/totalTries if totalTries else 1.0
+    
+    def score(i):
+        tries, successes, elapsed, iters=stats.get(control['algoTypes'][i], [0, 0, 0.0, 0])
+        if tries==0:
+            # try every algorithm once first.
+            return math.inf
+        # the cost of an attempt relative to the mean of all algorithms.
+        cost=(elapsed/tries)/meanTime if meanTime>0 else 1.0
+        cost=max(cost, 1.0e-3)
+        if control['algoOrder']=='thompson':
+            return random.betavariate(successes+1, tries-successes+1)/cost
+        return (successes/tries)/cost+control['ucbFactor']*math.sqrt(math.log(max(totalTries, 1))/tries)
+    
+    return max(candidates, key=score)
+
+
+def loadAlgoStats(path):
+    '''
+    Load the statistics of the algorithms saved by a previous run.
+    Return an empty dict if the file does not exist.
+    '''
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {int(code): value for code, value in json.load(f).items()}
+
+
+def saveAlgoStats(path, stats, saved):
+    '''
+    Save the statistics of the algorithms, {algoType: [tries, successes, time, iterations]}.
+    saved: the statistics that are already in the file, i.e. loaded at the start or saved before.
+    Only the statistics added since then are added to the file, which is read again under a lock,
+    so the runs that share the file at the same time do not overwrite each other.
+    '''
+    with open(path+'.lock', 'w') as lock:
+        if has_fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        total=loadAlgoStats(path)
+        for code, value in stats.items():
+            old=saved.get(code, [0, 0, 0.0, 0])
+            line=total.setdefault(code, [0, 0, 0.0, 0])
+            for i in range(len(line)):
+                line[i]+=value[i]-old[i]
+        with open(path+'.tmp', 'w') as f:
+            json.dump({str(code): value for code, value in total.items()}, f)
+        os.replace(path+'.tmp', path)
+
+
+def copyAlgoStats(stats):
+    '''
+    Return a copy of the statistics of the algorithms.
+    '''
+    return {code: list(value) for code, value in stats.items()}
+
+
+class RecoveryStage:
+    '''
+    A way to converge that is tried when a trial does not converge.
+    The stages of control['recoveryStages'] are tried in turn until one applies.
+    name: the strategy of the work items it pushes, used in strategyCalls and strategyTime.
+    sameStep: True if the stage tries the same step again. The algorithms and the test types
+        tried since the step started are then kept, so they are not tried twice.
+    To add a way to converge, subclass it and put an instance in control['recoveryStages'].
+    '''
+    name=''
+    sameStep=False
+    
+    def recover(self, failure, control, current):
+        '''
+        failure: a dict of the step, algoIndex, testIterTimes, testTol and strategy of the failed trial.
+            A stage may set flags in it for the next stages.
+        Return a list of work items to push (the last one is analyzed first),
+        or None if the stage does not apply.
+        '''
+        return None
+    
+    def __repr__(self):
+        return "%s()" %(type(self).__name__)
+
+
+class RaceStage(RecoveryStage):
+    '''
+    Race the strategies in parallel processes, see raceAnalyze.
+    Only available on systems that support os.fork(). If no strategy converges,
+    AlterAlgoTypesStage skips the algorithms that are raced at the full step.
+    '''
+    name='race'
+    
+    def recover(self, failure, control, current):
+        if not hasattr(os, 'fork'):
+            return None
+        rest=raceAnalyze(failure['step'], control, current)
+        if rest is None:
+            return None
+        if rest==0:
+            return []
+        failure['divided']=True
+        return [segmentItem(rest, failure['testIterTimes'], failure['testTol'], control, self.name)]
+
+
+class AddTestTimesStage(RecoveryStage):
+    '''
+    Try the same step with more test iterations.
+    If `addTestTimesMode` is "threshold", use `testIterTimesMore` if the last norm is smaller than `normTol`.
+    If it is "trend", use the number predicted by predictTestTimes from the norms of the failed trial.
+    '''
+    name='addTestTimes'
+    sameStep=True
+    
+    def recover(self, failure, control, current):
+        if failure['testIterTimes']>=control['testIterTimesMore']:
+            return None
+        norm=ops.testNorms()
+        if control['addTestTimesMode']=='trend':
+            testIterTimes=predictTestTimes(norm, failure['testTol'], control)
+            if testIterTimes is None or testIterTimes<=failure['testIterTimes']:
+                return None
+        # if current norm is too large, try another way.
+        elif norm[-1]>=control['normTol']:
+            logger.info(">>> SmartAnalyze: Not adding test times for norm %f", norm[-1])
+            return None
+        else:
+            testIterTimes=control['testIterTimesMore']
+        logger.info(">>> SmartAnalyze: Adding test times to %i.", testIterTimes)
+        return [['trial', failure['step'], failure['algoIndex'], testIterTimes, failure['testTol'], self.name]]
+
+
+def predictTestTimes(norms, testTol, control):
+    '''
+    norms: the test norms of the failed trial, from ops.testNorms()
+    testTol: the test tolerance
+    Estimate the rate of convergence from the last `trendWindow` norms, and return the number
+    of iterations predicted to reach testTol times `trendMargin`, not more than `testIterTimesMore`.
+    Return None if the norms are not contracting, or the prediction exceeds `testIterTimesMore`.
+    '''
+    norms=[norm for norm in norms if norm>0]
+    window=norms[-control['trendWindow']-1:]
+    if len(window)<2:
+        logger.info(">>> SmartAnalyze: Not adding test times. Too few norms to see a trend.")
+        return None
+    # the mean ratio of successive norms in the window.
+    rate=(window[-1]/window[0])**(1.0/(len(window)-1))
+    if rate>=1.0:
+        logger.info(">>> SmartAnalyze: Not adding test times for diverging norms (rate %f).", rate)
+        return None
+    more=math.log(testTol/window[-1])/math.log(rate) if window[-1]>testTol else 1.0
+    predicted=int(math.ceil((len(norms)+max(more, 1.0))*control['trendMargin']))
+    if predicted>control['testIterTimesMore']:
+        logger.info(">>> SmartAnalyze: Not adding test times. %i iterations are predicted for rate %f.", predicted, rate)
+        return None
+    return predicted
+
+
+class AlterAlgoTypesStage(RecoveryStage):
+    '''
+    Try the same step with the next algorithm of `algoTypes`, in the order of `algoOrder`.
+    '''
+    name='alterAlgoTypes'
+    sameStep=True
+    
+    def recover(self, failure, control, current):
+        nextIndex=nextAlgoIndex(failure['algoIndex'], control, current)
+        if nextIndex is None:
+            return None
+        logger.info(">>> SmartAnalyze: Setting algorithm to  %i.", control['algoTypes'][nextIndex])
+        return [['trial', failure['step'], nextIndex, failure['testIterTimes'], failure['testTol'], self.name]]
+
+
+class SwitchTestTypeStage(RecoveryStage):
+    '''
+    Try the same step with the next untried test type of testTypes, default is `switchTestTypes`.
+    The tolerance is kept, and the test type is set back to `testType` when a new step starts.
+    '''
+    name='switchTestType'
+    sameStep=True
+    
+    def __init__(self, testTypes=None):
+        self.testTypes=testTypes
+    
+    def recover(self, failure, control, current):
+        testTypes=self.testTypes if self.testTypes is not None else control['switchTestTypes']
+        for testType in testTypes:
+            if testType not in current['triedTestTypes']:
+                logger.info(">>> SmartAnalyze: Setting test type to %s", testType)
+                useTest(failure['testIterTimes'], failure['testTol'], control, current, testType)
+                return [['trial', failure['step'], failure['algoIndex'], failure['testIterTimes'], failure['testTol'], self.name]]
+        return None
+    
+    def __repr__(self):
+        return "SwitchTestTypeStage(%r)" %(self.testTypes)
+
+
+class InitialStiffnessStage(RecoveryStage):
+    '''
+    Try the same step with an algorithm on the initial stiffness, default is `initialStiffnessAlgo`.
+    The algorithm does not need to be in `algoTypes`.
+    '''
+    name='initialStiffness'
+    sameStep=True
+    
+    def __init__(self, algoType=None):
+        self.algoType=algoType
+    
+    def recover(self, failure, control, current):
+        algoType=self.algoType if self.algoType is not None else control['initialStiffnessAlgo']
+        if algoType in control['algoTypes']:
+            algoIndex=control['algoTypes'].index(algoType)
+        else:
+            algoIndex=-1
+        if algoIndex in current['triedAlgos']:
+            return None
+        logger.info(">>> SmartAnalyze: Setting algorithm to %i on the initial stiffness.", algoType)
+        if algoIndex<0:
+            useAlgorithm(algoType, current)
+            current['algoIndex']=-1
+        return [['trial', failure['step'], algoIndex, failure['testIterTimes'], failure['testTol'], self.name]]
+    
+    def __repr__(self):
+        return "InitialStiffnessStage(%r)" %(self.algoType)
+
+
+class ArcLengthStage(RecoveryStage):
+    '''
+    Under displacement control, if the step has been divided `arcLengthAfter` times, e.g. near a limit point,
+    pass it with the ArcLength integrator, which can follow a snap-back. See the 'arc' items of analyzeStack.
+    It does not apply if the load factor of the last converged step decreases.
+    '''
+    name='arcLength'
+    
+    def recover(self, failure, control, current):
+        step=failure['step']
+        if control['analysis']!='Static' or control['integrator']!='DisplacementControl':
+            return None
+        if abs(step)>current['maxStep']*control['relaxation']**control['arcLengthAfter']*(1+1.0e-9):
+            return None
+        # ArcLength starts with an increasing load factor, so it cannot follow a decreasing load.
+        if current.get('loadStep', 1.0)<0:
+            logger.info(">>> SmartAnalyze: The load factor decreases. Not switching to arc length.")
+            return None
+        target=ops.nodeDisp(current['node'], current['dof'])+step
+        arcLength=control['arcLength'] or abs(step)
+        logger.info(">>> SmartAnalyze: Switching to arc length %f to pass displacement %f.", arcLength, target)
+        failure['divided']=True
+        return [['arc', target, math.copysign(1.0, step), arcLength, 0, failure['testIterTimes'], failure['testTol'], self.name]]
+
+
+class LooseTestTolStage(RecoveryStage):
+    '''
+    If the step is smaller than 2*minStep, try it with the tolerance `looseTestTolTo`.
+    The algorithm and the test iteration times are set back.
+    '''
+    name='looseTestTol'
+    
+    def recover(self, failure, control, current):
+        if abs(failure['step'])>=2*control['minStep'] or current['testTol']==control['looseTestTolTo']:
+            return None
+        logger.info(">>> SmartAnalyze: current step %f is too small!", failure['step'])
+        logger.warning("!!! SmartAnalyze: Warning: Loosing test tolerance")
+        return [['trial', failure['step'], None, control['testIterTimes'], control['looseTestTolTo'], self.name]]
+
+
+class DivideStage(RecoveryStage):
+    '''
+    Divide the step into two. The first one is the step times `relaxation`, and not smaller than `minStep`.
+    It does not apply if the step is smaller than 2*minStep, or to the arc length integrators.
+    '''
+    name='divide'
+    
+    def recover(self, failure, control, current):
+        step=failure['step']
+        if control['integrator'] in arcIntegrators:
+            logger.info(">>> SmartAnalyze: The arc length %f is not divided.", step)
+            return None
+        if abs(step)<2*control['minStep']:
+            logger.info(">>> SmartAnalyze: current step %f is too small!", step)
+            return None
+        
+        stepNew=step*control['relaxation']
+        if stepNew>0 and stepNew<control['minStep']:
+            stepNew=control['minStep']
+        
+        if stepNew<0 and stepNew>-control['minStep']:
+            stepNew=-control['minStep']
+        
+        stepRest=step-stepNew
+        logger.info(">>> SmartAnalyze: Dividing the current step %f into %f and %f", step, stepNew, stepRest)
+        # the step controller continues from the reduced step.
+        if control['stepControl']=='adaptive':
+            current['adaptStep']=min(current['adaptStep'], abs(stepNew))
+        failure['divided']=True
+        return [segmentItem(stepRest, failure['testIterTimes'], failure['testTol'], control, self.name),
+                ['trial', stepNew, None, failure['testIterTimes'], failure['testTol'], self.name]]
+
+
+# the recovery stages that can be named in control['recoveryStages']
+stageTypes={stage.name: stage for stage in (RaceStage, AddTestTimesStage, AlterAlgoTypesStage,
+            SwitchTestTypeStage, InitialStiffnessStage, ArcLengthStage, LooseTestTolStage, DivideStage)}
+
+
+def recoveryStages(control):
+    '''
+    Return the list of recovery stages of control['recoveryStages'].
+    Its items are RecoveryStage objects or the names in stageTypes.
+    If it is None, the stages are chosen by `raceMode`, the `try-` flags and `autoArcLength`:
+    race, addTestTimes, alterAlgoTypes, arcLength, looseTestTol and divide.
+    '''
+    stages=control['recoveryStages']
+    if stages is None:
+        stages=[]
+        if control['raceMode']:
+            stages.append('race')
+        if control['tryAddTestTimes']:
+            stages.append('addTestTimes')
+        if control['tryAlterAlgoTypes']:
+            stages.append('alterAlgoTypes')
+        if control['autoArcLength']:
+            stages.append('arcLength')
+        if control['tryLooseTestTol']:
+            stages.append('looseTestTol')
+        stages.append('divide')
+    return [stageTypes[stage]() if isinstance(stage, str) else stage for stage in stages]
+
+
+def RecursiveAnalyze(step, algoIndex, testIterTimes, testTol, vcontrol, vcurrent):
+    '''
+    step: dt for transient analysis, and a displacement step length for static analysis.
+    algoIndex: Algorithm index that is used.
+    testIterTimes: Maximum nunmber of tests.
+    testTol: test tolarence.
+    vcontrol: control variables
+    vcurrent: current control variables
+    Return 0 if converged, 1 if converged after dividing the step, -1 if not converged,
+    and -2 if `timeLimit` is exceeded.
+    '''
+    return analyzeStack([['trial', step, algoIndex, testIterTimes, testTol, 'initial']], vcontrol, vcurrent)
+
+
+def analyzeStack(stack, control, current):
+    '''
+    stack: a list of pending work items. The last one is analyzed first.
+        ['trial', step, algoIndex, testIterTimes, testTol, strategy]: analyze one step.
+            If algoIndex is None, the algorithm is chosen by the `algoPolicy`.
+        ['march', remaining, testIterTimes, testTol, strategy]: march the remaining length
+            with the step length of the adaptive step controller.
+        ['arc', target, direction, arcLength, arcSteps, testIterTimes, testTol, strategy]: analyze with
+            the ArcLength integrator until the displacement of the control node passes target in direction.
+            The integrator is set once, and the arc length is not divided.
+        strategy is the name of the recovery stage that created the item, counted in
+            current['strategyCalls'] and current['strategyTime'].
+    The engine of RecursiveAnalyze. Instead of calling itself, every way to converge
+    pushes the items it needs to the stack, so there is no limit of depth.
+    Return 0 if converged, 1 if converged after dividing a step, -1 if not converged,
+    and -2 if `timeLimit` is exceeded.
+    '''
+    divided=False
+    while stack:
+        if control['timeLimit']>0 and time.time()-current['startTime']>control['timeLimit']:
+            return -2
+        item=stack.pop()
+        
+        if item[0]=='march':
+            remaining, testIterTimes, testTol, strategy=item[1:]
+            sub=math.copysign(min(current['adaptStep'], abs(remaining)), remaining)
+            # do not leave a residual smaller than minStep.
+            if abs(remaining-sub)<control['minStep']:
+                sub=remaining
+            if remaining-sub==remaining and sub!=remaining:
+                # the step length is too small to change the rest, e.g. minStep is 0. The march would never end.
+                logger.warning("!!! SmartAnalyze: The step length %g of the step controller is too small.", sub)
+                return -1
+            if sub!=remaining:
+                stack.append(['march', remaining-sub, testIterTimes, testTol, strategy])
+            if sub!=0:
+                stack.append(['trial', sub, None, testIterTimes, testTol, strategy])
+            continue
+        
+        if item[0]=='arc':
+            target, direction, arcLength, arcSteps, testIterTimes, testTol, strategy=item[1:]
+            if testIterTimes!=current['testIterTimes'] or testTol!=current['testTol']:
+                useTest(testIterTimes, testTol, control, current)
+            start=time.perf_counter()
+            position=ops.nodeDisp(current['node'], current['dof'])
+            ok=trialAnalyze(arcLength, control, current, 'ArcLength')
+            addStrategyCost(strategy, 1, time.perf_counter()-start, current)
+            # a new ArcLength integrator would lose the direction of the path,
+            # so the arc length is kept and the other algorithms are tried.
+            for algoIndex in range(len(control['algoTypes'])):
+                if ok==0:
+                    break
+                if algoIndex==current['algoIndex']:
+                    continue
+                logger.info(">>> SmartAnalyze: Setting algorithm to %i", control['algoTypes'][algoIndex])
+                useAlgorithm(control['algoTypes'][algoIndex], current)
+                current['algoIndex']=algoIndex
+                start=time.perf_counter()
+                ok=trialAnalyze(arcLength, control, current, 'ArcLength')
+                addStrategyCost(strategy, 1, time.perf_counter()-start, current)
+            if ok<0:
+                logger.warning("!!! SmartAnalyze: Arc length %f does not converge.", arcLength)
+                return -1
+            current['segmentDone']=current.get('segmentDone', 0.0)+ops.nodeDisp(current['node'], current['dof'])-position
+            rest=target-ops.nodeDisp(current['node'], current['dof'])
+            if rest*direction>=control['minStep']:
+                if arcSteps+1>=control['arcLengthMaxSteps']:
+                    logger.warning("!!! SmartAnalyze: Displacement %f is not passed in %i arc length steps.", target, arcSteps+1)
+                    return -1
+                stack.append(['arc', target, direction, arcLength, arcSteps+1, testIterTimes, testTol, strategy])
+                continue
+            # the displacement is passed. Go back to the target by displacement control.
+            logger.info(">>> SmartAnalyze: Switching back to displacement control.")
+            if abs(rest)>=control['minStep']:
+                stack.append(segmentItem(rest, testIterTimes, testTol, control, strategy))
+            continue
+        
+        step, algoIndex, testIterTimes, testTol, strategy=item[1:]
+        if algoIndex is None:
+            algoIndex=startAlgoIndex(control, current)
+        # the fallbacks of a failed trial are popped right after it,
+        # so a new set of tried algorithms and test types starts with any other trial.
+        if strategy not in current['sameStepStrategies']:
+            current['triedAlgos']=set()
+            current['triedTestTypes']=set()
+            if current['testType']!=control['testType']:
+                logger.info(">>> SmartAnalyze: Setting test type back to %s", control['testType'])
+                useTest(current['testIterTimes'], current['testTol'], control, current, control['testType'])
+        current['triedAlgos'].add(algoIndex)
+        current['triedTestTypes'].add(current['testType'])
+        
+        if control['debugMode']:
+            logger.info('CONTROL PARAMETERS:\n%s', control)
+            logger.info('CURRENT STATE PARAMETERS:\n%s', current)
+        
+        # print the control parameters
+        if control['debugMode']:
+            logger.info("*** SmartAnalyze: Run Recursive: step=%f, algoI=%i, times=%i, tol=%f", step, algoIndex, testIterTimes, testTol)
+        
+        # switch algorithm
+        if algoIndex!=current['algoIndex']:
+            logger.info(">>> SmartAnalyze: Setting algorithm to %i", control['algoTypes'][algoIndex])
+            useAlgorithm(control['algoTypes'][algoIndex], current)
+            current['algoIndex']=algoIndex
+        
+        # change number of tests and tolerance
+        if testIterTimes!=current['testIterTimes'] or testTol!=current['testTol']:
+            if testIterTimes!=current['testIterTimes']:
+                logger.info(">>> SmartAnalyze: Setting test iteration times to %i", testIterTimes)
+            if testTol!=current['testTol']:
+                logger.info("SmartAnalyze: Setting test tolerance to %f", testTol)
+                
+            useTest(testIterTimes, testTol, control, current)
+        
+        # trial analyze once
+        start=time.perf_counter()
+        ok=trialAnalyze(step, control, current)
+        addStrategyCost(strategy, 1, time.perf_counter()-start, current)
+        # an algorithm out of algoTypes (e.g. of InitialStiffnessStage) is not held.
+        if control['algoPolicy']=='sticky' and algoIndex>=0:
+            updateStickyAlgorithm(ok, algoIndex, control, current)
+        
+        if ok==0:
+            if control['stepControl']=='adaptive':
+                updateStepController(control, current)
+            if control['printPer'] != 0 and current['counter']>=control['printPer']:
+                logger.info("* SmartAnalyze: progress %f. Time consumption: %f s.",
+                    progressFraction(current), (time.time()-current['startTime'])/1000.0)
+                current['counter']=0
+            continue
+        
+        # not converge, try the recovery stages in turn until one applies.
+        failure={'step': step, 'algoIndex': algoIndex, 'testIterTimes': testIterTimes,
+                 'testTol': testTol, 'strategy': strategy}
+        for stage in current['stages']:
+            start=time.perf_counter()
+            items=stage.recover(failure, control, current)
+            addStrategyCost(stage.name, 0, time.perf_counter()-start, current)
+            if items is not None:
+                break
+        else:
+            # Here, all methods have been tried. Return negative value.
+            return -1
+        if failure.get('divided'):
+            divided=True
+        stack.extend(items)
+    
+    if divided:
+        return 1
+    return 0
+        
+        
+    
+
+def setAlgorithm(algotype):
+    '''
+        Predefine some algorithms.
+    '''
+    def case0():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Linear ...")
+        ops.algorithm('Linear')
+    
+    def case1():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Linear -initial ...")
+        ops.algorithm('Linear', initial=True)
+    
+    def case2():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Linear -factorOnce ...")
+        ops.algorithm('Linear', factorOnce=True)
+        
+    def case10():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Newton ...")
+        ops.algorithm('Newton')
+    
+    def case11():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Newton -initial ...")
+        ops.algorithm('Newton', initial=True)
+    
+    def case12():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Newton -initialThenCurrent ...")
+        ops.algorithm('Newton', initialThenCurrent=True)
+    
+    def case20():
+        logger.debug("> SmartAnalyze: Setting algorithm to  NewtonLineSearch ...")
+        ops.algorithm('NewtonLineSearch')
+    
+    def case21():
+        logger.debug("> SmartAnalyze: Setting algorithm to  NewtonLineSearch -type Bisection ...")
+        ops.algorithm('NewtonLineSearch', True)
+    
+    def case22():
+        logger.debug("> SmartAnalyze: Setting algorithm to  NewtonLineSearch -type Secant ...")
+        ops.algorithm('NewtonLineSearch', Secant=True)
+    
+    def case23():
+        logger.debug("> SmartAnalyze: Setting algorithm to  NewtonLineSearch -type RegulaFalsi ...")
+        ops.algorithm('NewtonLineSearch', RegulaFalsi=True)
+    
+    def case30():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Modified Newton ...")
+        ops.algorithm('ModifiedNewton')
+    
+    def case31():
+        logger.debug("> SmartAnalyze: Setting algorithm to  ModifiedNewton -initial ...")
+        ops.algorithm('ModifiedNewton', False, True)
+    
+    def case40():
+        logger.debug("> SmartAnalyze: Setting algorithm to  KrylovNewton ...")
+        ops.algorithm('KrylovNewton')
+    
+    def case41():
+        logger.debug("> SmartAnalyze: Setting algorithm to  KrylovNewton -iterate initial ...")
+        ops.algorithm('KrylovNewton', iterate='initial')
+    
+    def case42():
+        logger.debug("> SmartAnalyze: Setting algorithm to  KrylovNewton -increment initial ...")
+        ops.algorithm('KrylovNewton', increment='initial')
+    
+    def case43():
+        logger.debug("> SmartAnalyze: Setting algorithm to  KrylovNewton -iterate initial -increment initial ...")
+        ops.algorithm('KrylovNewton', iterate='initial', increment='initial')
+    
+    def case44():
+        logger.debug("> SmartAnalyze: Setting algorithm to  KrylovNewton -maxDim 50")
+        ops.algorithm('KrylovNewton', maxDim=50)
+    
+    def case45():
+        logger.debug("> SmartAnalyze: Setting algorithm to  KrylovNewton -iterate initial -increment initial -maxDim 50")
+        ops.algorithm('KrylovNewton', iterate='initial', increment='initial', maxDim=50)
+    
+    def case50():
+        logger.debug("> SmartAnalyze: Setting algorithm to  SecantNewton ...")
+        ops.algorithm('SecantNewton')
+
+    def case51():
+        logger.debug("> SmartAnalyze: Setting algorithm to  SecantNewton -iterate initial ...")
+        ops.algorithm('SecantNewton', iterate='initial')
+    
+    def case52():
+        logger.debug("> SmartAnalyze: Setting algorithm to  SecantNewton -increment initial  ...")
+        ops.algorithm('SecantNewton', increment='initial')
+    
+    def case53():
+        logger.debug("> SmartAnalyze: Setting algorithm to  SecantNewton -iterate initial -increment initial ...")
+        ops.algorithm('SecantNewton', iterate='initial', increment='initial')
+    
+    def case60():
+        logger.debug("> SmartAnalyze: Setting algorithm to  BFGS ...")
+        ops.algorithm('BFGS')
+    
+    def case70():
+        logger.debug("> SmartAnalyze: Setting algorithm to  Broyden ...")
+        ops.algorithm('Broyden')
+    
+    def case80():
+        logger.debug("> SmartAnalyze: Setting algorithm to  PeriodicNewton ...")
+        ops.algorithm('PeriodicNewton')
+    
+    def case90():
+        #UserAlgorithm0
+        pass
+        
+    def default():
+        logger.error("!!! SmartAnalyze: ERROR! WRONG Algorithm Type %s!", algotype)
+    
+    
+    switch={'0':case0, '1':case1, '2':case2, '10':case10,'11':case11, '12':case12,
+            '20':case20, '21':case21, '22':case22, '23':case23,
+            '30':case30, '31':case31, '40':case40, '41':case41, '42':case42, '43':case43, '44':case44, '45':case45,
+            '50':case50, '51':case51,'52':case52,'53':case53, '60':case60, '70':case70, '80':case80, '90':case90, 'default':default}
+    
+    choice=str(algotype)
+    switch.get(choice, default)()
+    
+
+def printBanner():
+    logger.info(""" ********************************************************************** "
+ *                           WELCOME TO                               * "
+ *  _____                      _    ___              _                * "
+ * /  ___|                    | |  / _ \\            | |               * "
+ * \\ `--. _ __ ___   __ _ _ __| |_/ /_\\ \\_ __   __ _| |_   _ _______  * "
+ *  `--. \\ '_ ` _ \\ / _` | '__| __|  _  | '_ \\ / _` | | | | |_  / _ \\ * "
+ * /\\__/ / | | | | | (_| | |  | |_| | | | | | | (_| | | |_| |/ /  __/ * "
+ * \\____/|_| |_| |_|\\__,_|_|   \\__\\_| |_/_| |_|\\__,_|_|\\__, /___\\___| * "
+ *                                                      __/ |         * "
+ *                                                     |___/          * "
+ * Author: Hanlin DONG (http://www.hanlindong.com)                    * "
+ * License: MIT (https://opensource.org/licenses/MIT).                * "
+ ********************************************************************** "
+Smart Analyze version %s loaded. Enjoy!"
+For transient analyze, call SmartAnalyzeTransient dt npts"
+For static analyze, call SmartAnalyzeStatic node dof targets maxStep"
+""", version)
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+